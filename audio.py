@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Audio file include the header readers of the recorded speeches and AudioIndex class,
+a sidecar index of the informations of every audio file of a directory
+"""
+import os
+import json
+import struct
+
+# kbps by [mpeg 1 or 2][layer 1, 2, 3][bitrate index]
+MP3_BITRATES = {
+    1: {1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)},
+    2: {1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)},
+}
+# Hz by mpeg version bits
+MP3_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+MP3_SCAN = 1 << 16
+
+
+def info(file: str) -> dict:
+    """
+    read the informations of an audio file from its headers, without decoding the audio
+    the format is detected from the content, not from the extension
+    :param str file:
+        file full name
+    :return dict:
+        duration in seconds, rate in Hz, channels and size in bytes
+    """
+    size = os.path.getsize(file)
+    with open(file, 'rb') as f:
+        head = f.read(12)
+        f.seek(0)
+        if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+            duration, rate, channels = wav_info(f)
+        elif head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'):
+            duration, rate, channels = aiff_info(f)
+        else:
+            duration, rate, channels = mp3_info(f, size)
+    return {'duration': duration, 'rate': rate, 'channels': channels, 'size': size}
+
+
+def wav_info(f) -> tuple:
+    """
+    read the fmt and data chunks of a wav file
+    :return tuple:
+        duration, rate, channels
+    """
+    f.seek(12)
+    rate = channels = byte_rate = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError('wav file without data chunk')
+        chunk, length = struct.unpack('<4sI', header)
+        if chunk == b'fmt ':
+            _, channels, rate, byte_rate = struct.unpack('<HHII', f.read(12))
+            f.seek(length - 12 + length % 2, 1)
+        elif chunk == b'data':
+            if not byte_rate:
+                raise ValueError('wav file without fmt chunk')
+            return length / byte_rate, rate, channels
+        else:
+            f.seek(length + length % 2, 1)
+
+
+def aiff_info(f) -> tuple:
+    """
+    read the COMM chunk of an aiff file
+    :return tuple:
+        duration, rate, channels
+    """
+    f.seek(12)
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError('aiff file without COMM chunk')
+        chunk, length = struct.unpack('>4sI', header)
+        if chunk == b'COMM':
+            channels, frames, _, exponent, mantissa = struct.unpack('>HIHHQ', f.read(18))
+            # 80 bits extended float
+            rate = mantissa * 2.0 ** ((exponent & 0x7FFF) - 16383 - 63)
+            return frames / rate, int(rate), channels
+        f.seek(length + length % 2, 1)
+
+
+def mp3_info(f, size: int) -> tuple:
+    """
+    read the first frame of a mp3 file, its Xing/Info or VBRI header gives the number of frames of a vbr file,
+    otherwise the duration is computed from the bitrate
+    :return tuple:
+        duration, rate, channels
+    """
+    start = 0
+    head = f.read(10)
+    if head[:3] == b'ID3':
+        length = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+        start = 10 + length + (10 if head[5] & 0x10 else 0)
+
+    f.seek(start)
+    data = f.read(MP3_SCAN)
+    for i in range(len(data) - 4):
+        if data[i] != 0xFF or data[i + 1] & 0xE0 != 0xE0:
+            continue
+        header = struct.unpack('>I', data[i:i + 4])[0]
+        version = header >> 19 & 3
+        layer = 4 - (header >> 17 & 3)
+        bitrate_index = header >> 12 & 15
+        rate_index = header >> 10 & 3
+        if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+
+        mono = header >> 6 & 3 == 3
+        channels = 1 if mono else 2
+        rate = MP3_RATES[version][rate_index]
+        bitrate = MP3_BITRATES[1 if version == 3 else 2][layer][bitrate_index] * 1000
+        samples = 384 if layer == 1 else 1152 if layer == 2 or version == 3 else 576
+
+        frames = None
+        side = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+        xing = data[i + 4 + side:i + 4 + side + 12]
+        vbri = data[i + 36:i + 36 + 18]
+        if xing[:4] in (b'Xing', b'Info') and struct.unpack('>I', xing[4:8])[0] & 1:
+            frames = struct.unpack('>I', xing[8:12])[0]
+        elif vbri[:4] == b'VBRI':
+            frames = struct.unpack('>I', vbri[14:18])[0]
+
+        if frames is not None:
+            return frames * samples / rate, rate, channels
+        return (size - start - i) * 8 / bitrate, rate, channels
+
+    raise ValueError('unknown audio format')
+
+
+class AudioIndex:
+    """
+    sidecar index of the audio files of a directory
+    the entries are invalidated by the modification time and the size of the files
+    """
+
+    name = '.audio-index.json'
+
+    def __init__(self, directory: str):
+        """
+        Construct a :class:`AudioIndex <AudioIndex>`.
+        :param str directory:
+            directory of the audio files
+        """
+        self.directory = str(directory)
+        self.file = os.path.join(self.directory, self.name)
+        self.entries = {}
+        self.changed = False
+        self.load()
+
+    def load(self):
+        """load the index of the directory"""
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """save the index of the directory if it changed"""
+        if not self.changed:
+            return
+        temp = f'{self.file}.{os.getpid()}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(temp, self.file)
+        self.changed = False
+
+    def get(self, file: str) -> dict:
+        """
+        get the informations of an audio file, read its headers only if it changed since it was indexed
+        :param str file:
+            file full name
+        :return dict:
+            duration in seconds, rate in Hz, channels and size in bytes
+        """
+        stat = os.stat(file)
+        name = os.path.basename(file)
+        entry = self.entries.get(name)
+        if not entry or entry['mtime'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            entry = info(file)
+            entry['mtime'] = stat.st_mtime_ns
+            self.entries[name] = entry
+            self.changed = True
+        return entry
+
+    def duration(self, file: str) -> float:
+        """
+        get the duration of an audio file
+        :param str file:
+            file full name
+        """
+        return self.get(file)['duration']
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f'AudioIndex(directory={self.directory}, entries={len(self)})'
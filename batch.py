@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Batch file include Batch class, which runs the whole Spych pipeline for many jobs over a pool of processes
+the finished jobs are written in a ledger so an interrupted batch resumes where it stopped
+
+usage : python batch.py manifest.jsonl --workers 4
+each line of the manifest is a search query, or a json object of the arguments of Spych
+with the optional "speech" and "edit" objects of the arguments of Spych.speech and Spych.edit
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def run_job(job: dict) -> dict:
+    """
+    run the pipeline of one job in a worker process
+    :param dict job:
+        arguments of Spych, with the optional "speech" and "edit" arguments
+    :return dict:
+        time of each stage in seconds
+    """
+    from spych import Spych
+
+    arguments = dict(job)
+    speech = arguments.pop('speech', {})
+    edit = arguments.pop('edit', {})
+
+    timings = {}
+    start = time.perf_counter()
+    spych = Spych(autoprocess=False, **arguments)
+    timings['find'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    spych.speech(**speech)
+    timings['speech'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    spych.edit(**edit)
+    timings['edit'] = time.perf_counter() - start
+    return timings
+
+
+class Batch:
+    """run many Spych jobs across a pool of processes with a ledger of the finished jobs"""
+
+    def __init__(self, manifest: str, ledger: str='', workers: int=0):
+        """
+        Construct a :class:`Batch <Batch>`.
+        :param str manifest:
+            file of the jobs, one query or one json object per line
+        :param str ledger:
+            file of the finished jobs, next to the manifest by default
+        :param int workers:
+            number of worker processes, 0 for the number of cores
+        """
+        self.manifest = manifest
+        self.ledger = ledger or f'{os.path.splitext(manifest)[0]}.ledger.jsonl'
+        self.workers = workers or os.cpu_count()
+        self.jobs = self.read_manifest()
+        self.results = self.read_ledger()
+
+    def read_manifest(self) -> dict:
+        """
+        read the jobs of the manifest
+        :return dict:
+            jobs by id, the id is a hash of the job
+        """
+        jobs = {}
+        with open(self.manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                job = json.loads(line) if line.startswith('{') else {'query': line}
+                jobs[self.job_id(job)] = job
+        return jobs
+
+    def read_ledger(self) -> dict:
+        """
+        read the results of the previous runs, the last result of a job wins
+        :return dict:
+            results by job id
+        """
+        results = {}
+        if os.path.exists(self.ledger):
+            with open(self.ledger, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue  # line cut by a crash
+                    results[result['id']] = result
+        return results
+
+    def write_ledger(self, result: dict):
+        """append a result to the ledger and make sure it reached the disk"""
+        with open(self.ledger, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.results[result['id']] = result
+
+    @staticmethod
+    def job_id(job: dict) -> str:
+        """get the id of a job"""
+        return hashlib.sha1(json.dumps(job, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+    @property
+    def pending(self) -> dict:
+        """jobs which did not finish successfully yet"""
+        return {i: job for i, job in self.jobs.items() if self.results.get(i, {}).get('status') != 'done'}
+
+    def run(self):
+        """run the pending jobs and print the summary"""
+        pending = self.pending
+        print(f'{len(self.jobs) - len(pending)} jobs already done, {len(pending)} jobs to run '
+              f'on {self.workers} workers')
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(run_job, job): (i, job) for i, job in pending.items()}
+            for future in as_completed(futures):
+                i, job = futures[future]
+                result = {'id': i, 'job': job, 'seconds': 0}
+                try:
+                    timings = future.result()
+                    result.update(status='done', timings=timings, seconds=sum(timings.values()))
+                except Exception as e:
+                    result.update(status='failed', error=f'{type(e).__name__}: {e}',
+                                  traceback=''.join(traceback.format_exception(type(e), e, e.__traceback__)))
+                self.write_ledger(result)
+                print(f'Job {i} {result["status"]}' + (f' in {result["seconds"]:.1f}s' if result['seconds'] else ''))
+
+        self.summary()
+
+    def summary(self):
+        """print the timings of every job of the manifest"""
+        print(f'{"job":<12} {"status":<8} {"total":>8} {"find":>8} {"speech":>8} {"edit":>8}  name')
+        for i, job in self.jobs.items():
+            result = self.results.get(i, {'status': 'pending'})
+            timings = result.get('timings', {})
+            name = job.get('query') or job.get('directory_name') or job.get('video_name') or ''
+            columns = [f'{result.get("seconds", 0):8.1f}'] + [f'{timings.get(s, 0):8.1f}' for s in
+                                                             ('find', 'speech', 'edit')]
+            print(f'{i:<12} {result["status"]:<8} {" ".join(columns)}  {name}')
+            if result['status'] == 'failed':
+                print(f'{"":<12} {result["error"]}')
+
+        done = [r for i, r in self.results.items() if i in self.jobs and r['status'] == 'done']
+        print(f'{len(done)}/{len(self.jobs)} jobs done, {sum(r["seconds"] for r in done):.1f}s of work')
+
+    def __repr__(self):
+        return f'Batch(manifest={self.manifest}, jobs={len(self.jobs)}, pending={len(self.pending)})'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='run Spych on every job of a manifest')
+    parser.add_argument('manifest', help='one search query or one json object of Spych arguments per line')
+    parser.add_argument('--ledger', default='', help='file of the finished jobs')
+    parser.add_argument('--workers', type=int, default=0, help='number of worker processes')
+    arguments = parser.parse_args(argv)
+    Batch(arguments.manifest, ledger=arguments.ledger, workers=arguments.workers).run()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,635 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark file include the offline benchmarks of the Spych pipeline
+the subtitles, the speeches and the video are synthetic, nothing is downloaded and the speech engine is a fake
+which writes tones of a predictable length, so two runs on the same machine measure the same work
+
+usage : python benchmark.py --sizes 10 1000 50000 --compare benchmarks/previous.json
+each case (size, format) runs in its own process so its peak memory is its own,
+the results are saved in the benchmarks directory named after the commit
+
+python benchmark.py --gtts 200 also records 200 sequences with gtts_async from a local stand-in of google translate,
+at each concurrency of --concurrency, so the remote services are never called,
+and python benchmark.py --fetch 64 downloads 64 MiB in byte ranges from the local server, interrupts a download
+in the middle of a range then resumes it
+
+python benchmark.py --imports-only only checks the import of spych, the exit code is 1 if it is slower than
+the import budget or if it imports a heavy dependency which should be loaded on first use
+"""
+import io
+import os
+import sys
+import json
+import time
+import wave
+import zlib
+import base64
+import shutil
+import argparse
+import threading
+import http.server
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks')
+SIZES = (10, 1000, 10000, 50000)
+FORMATS = ('.srt', '.vtt')
+# the speeches of bigger cases are not rendered, their files would take gigabytes
+MAX_SPEECH = 2000
+RATE = 44100
+# seconds "import spych" may take in a new interpreter
+IMPORT_BUDGET = 0.3
+# dependencies loaded on first use, "import spych" must not import them
+LAZY_MODULES = ('pytube', 'youtubesearchpython', 'pandas', 'pyttsx3', 'gtts', 'moviepy', 'aiohttp', 'imageio_ffmpeg')
+# concurrencies of gtts_async benchmarked, and delay in seconds of each answer of the local server
+CONCURRENCY = (1, 8)
+LATENCY = 0.02
+# byte ranges of the benchmarked downloads
+PARTS = 8
+WORDS = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit', 'sed', 'do', 'eiusmod',
+         'tempor', 'incididunt', 'ut', 'labore', 'et', 'dolore', 'magna', 'aliqua', 'été', 'naïve', 'café')
+
+
+class FakeEngine:
+    """
+    deterministic replacement of the pyttsx3 engine, it writes a tone whose length depends on the text and the rate
+    the speed of the fake voice differs from a sequence to another so the rate has to converge as with a real voice
+    """
+
+    def __init__(self, rate: int=RATE):
+        self.rate = rate
+        self.properties = {'rate': 150}
+        self.queue = []
+
+    @staticmethod
+    def length(text: str, rate: float) -> float:
+        """duration in seconds of a text spoken at a rate in words per minute"""
+        words = max(1, len(text.split()))
+        voice = 0.8 + 0.4 * (zlib.crc32(text.encode('utf-8')) % 1000) / 1000
+        # the pause before the speech does not depend on the rate, the ratio is not reached in one recursion
+        return 0.1 + voice * 60 * words / max(rate, 1)
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def getProperty(self, name):
+        return self.properties.get(name)
+
+    def save_to_file(self, text, filename, name=None):
+        self.queue.append((text, filename, self.properties['rate']))
+
+    def runAndWait(self):
+        for text, filename, rate in self.queue:
+            write_tone(filename, self.length(text, rate), self.rate)
+        self.queue = []
+
+
+def write_tone(file, duration: float, rate: int=RATE, frequency: float=220.):
+    """write a 16 bits mono wav of a tone, file can be a file object"""
+    t = np.arange(int(duration * rate), dtype=np.float32) / rate
+    samples = (0.3 * np.sin(2 * np.pi * frequency * t) * 32767).astype('<i2')
+    with wave.open(file, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+
+
+def write_subtitles(file: str, size: int, seed: int=0) -> float:
+    """
+    write a synthetic srt or vtt file
+    :param str file:
+        file full name, its extension gives the format
+    :param int size:
+        number of sequences
+    :param int seed:
+        seed of the texts and the timings
+    :return float:
+        end of the last sequence in seconds
+    """
+    random = np.random.default_rng(seed)
+    vtt = file.endswith('.vtt')
+    separator = '.' if vtt else ','
+
+    def timestamp(seconds):
+        milliseconds = int(round(seconds * 1000))
+        h, milliseconds = divmod(milliseconds, 3600000)
+        m, milliseconds = divmod(milliseconds, 60000)
+        s, milliseconds = divmod(milliseconds, 1000)
+        return f'{h:02}:{m:02}:{s:02}{separator}{milliseconds:03}'
+
+    start = 0.
+    with open(file, 'w', encoding='utf-8') as f:
+        if vtt:
+            f.write('WEBVTT\nKind: captions\n\n')
+        for n in range(size):
+            start += random.uniform(0.2, 1.)
+            end = start + random.uniform(1., 4.)
+            words = [WORDS[i] for i in random.integers(0, len(WORDS), random.integers(2, 12))]
+            # some sequences span two lines
+            cut = len(words) // 2 if n % 3 == 0 else len(words)
+            lines = [' '.join(words[:cut]), ' '.join(words[cut:])]
+            text = '\n'.join(line for line in lines if line)
+            number = '' if vtt else f'{n + 1}\n'
+            settings = ' align:start position:0%' if vtt else ''
+            f.write(f'{number}{timestamp(start)} --> {timestamp(end)}{settings}\n{text}\n\n')
+            start = end
+    return start
+
+
+def write_video(file: str, duration: float) -> bool:
+    """
+    write a synthetic video with a test pattern and a tone
+    :return bool:
+        the video was written, ffmpeg is required
+    """
+    from mixer import ffmpeg_exe
+
+    command = [ffmpeg_exe(), '-y', '-v', 'error',
+               '-f', 'lavfi', '-i', f'testsrc=size=320x240:rate=25:duration={duration:.3f}',
+               '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration:.3f}',
+               '-c:v', 'mpeg4', '-c:a', 'aac', '-shortest', file]
+    try:
+        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+class LocalHandler(http.server.BaseHTTPRequestHandler):
+    """answer the requests sent to the local server"""
+
+    # kept alive connections, as the remote services, without waiting to send the body after the headers
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        """answer a request of gtts_async as google translate, with a short tone"""
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency)
+        audio = base64.b64encode(self.server.tone).decode('ascii')
+        body = f')]}}\'\n\n[["wrb.fr","jQ1olc","[\\"{audio}\\"]",null,null,null,"generic"]]\n'.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """serve the data of the server with its byte ranges, the first server.cut ranges stop in the middle"""
+        data = self.server.data
+        start, end, status = 0, len(data) - 1, 200
+        if self.headers.get('Range', '').startswith('bytes='):
+            first, _, last = self.headers['Range'][len('bytes='):].partition('-')
+            start, end, status = int(first), min(int(last or len(data) - 1), len(data) - 1), 206
+        length = end + 1 - start
+        with self.server.lock:
+            self.server.requests += 1
+            cut = status == 206 and length > 1 and self.server.cut > 0
+            self.server.cut -= cut
+        self.send_response(status)
+        self.send_header('Content-Length', str(length))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(data)}')
+        self.end_headers()
+        if cut:
+            # the connection is lost after half of the range
+            self.wfile.write(data[start:start + length // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServer(http.server.ThreadingHTTPServer):
+    """local stand-in of the remote services on a free port, served by a background thread"""
+
+    daemon_threads = True
+    # the default backlog of 5 drops connections opened at once, which are then retried a second later
+    request_queue_size = 64
+
+    def __init__(self, latency: float=LATENCY, data: bytes=b''):
+        """
+        :param float latency:
+            delay in seconds of each answer to gtts_async
+        :param bytes data:
+            content of the file served to the ranged downloads
+        """
+        super().__init__(('127.0.0.1', 0), LocalHandler)
+        self.latency = latency
+        self.data = data
+        self.cut = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        tone = io.BytesIO()
+        write_tone(tone, 0.5)
+        self.tone = tone.getvalue()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+def peak_memory():
+    """peak resident memory of this process in bytes, None if it can not be measured"""
+    try:
+        import resource
+    except ImportError:
+        # no resource module on windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def timed(function, *args, **kwargs):
+    """
+    :return:
+        (seconds, result) of a call
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_case(size: int, extension: str, max_speech: int=MAX_SPEECH, depth: int=2, packed: bool=False) -> dict:
+    """
+    benchmark every stage on one synthetic subtitles file, in a temporary working directory
+    :param int size:
+        number of sequences
+    :param str extension:
+        ".srt" or ".vtt"
+    :param int max_speech:
+        biggest size whose speeches are rendered and mixed
+    :param int depth:
+        number of recursions of the speech
+    :param bool packed:
+        keep the speeches in the packed store instead of one file per sequence
+    :return dict:
+        seconds, throughput and peak memory of each stage
+    """
+    sys.path.insert(0, ROOT)
+    from files import File
+    from subtitles import Subtitles
+    from instrument import Instrument
+
+    work = tempfile.mkdtemp(prefix='spych-benchmark-')
+    cwd = os.getcwd()
+    os.chdir(work)
+    stages = {}
+    try:
+        os.makedirs('videos/bench', exist_ok=True)
+        file = os.path.join(work, 'videos', 'bench', f'bench{extension}')
+        duration = write_subtitles(file, size)
+
+        seconds, subtitles = timed(Subtitles, File(file, find=False))
+        stages['read'] = {'seconds': seconds, 'per_second': size / seconds, 'peak': peak_memory()}
+
+        if size > max_speech:
+            return stages
+
+        instrument = Instrument()
+        subtitles.instrument = instrument
+        subtitles._engine = FakeEngine()
+        if packed:
+            from store import PackStore
+            subtitles.store = PackStore(str(subtitles.directory))
+        seconds, _ = timed(subtitles.speech, mode='pyttsx3', depth=depth)
+        converged = int(np.count_nonzero(np.abs(subtitles.cues.ratio - 1) <= 0.05))
+        passes = sum(1 for name in instrument.report()['totals'] if name.count('/') == 1)
+        stages['speech'] = {'seconds': seconds, 'per_second': size / seconds, 'passes': passes,
+                            'converged': converged, 'files': len(os.listdir(str(subtitles.directory))),
+                            'peak': peak_memory()}
+
+        # grading every sequence again, first from the headers then from the index of the durations
+        os.remove(subtitles.index.file)
+        subtitles.index = type(subtitles.index)(str(subtitles.directory))
+        seconds, _ = timed(subtitles.grade_pyttsx3)
+        stages['grade'] = {'seconds': seconds, 'per_second': size / seconds, 'peak': peak_memory()}
+        seconds, _ = timed(subtitles.grade_pyttsx3)
+        stages['grade_indexed'] = {'seconds': seconds, 'per_second': size / seconds, 'peak': peak_memory()}
+
+        from spych import Spych
+        from video import Video
+
+        video_file = os.path.join(work, 'videos', 'bench', 'bench.mp4')
+        duration += 1
+        if write_video(video_file, duration):
+            spych = Spych(video=Video(File(video_file, find=False)), subtitles=subtitles, autoprocess=False,
+                          instrument=instrument)
+            spych.edit(mode='remux')
+            totals = instrument.report()['totals']
+            for stage, name in (('mix', 'edit/mix'), ('write', 'edit/remux')):
+                seconds = totals[name]['wall']
+                stages[stage] = {'seconds': seconds, 'audio_per_second': duration / seconds, 'peak': peak_memory()}
+        else:
+            # no ffmpeg, only the mixing is measured
+            open(video_file, 'wb').close()
+            spych = Spych(video=Video(File(video_file, find=False)), subtitles=subtitles, autoprocess=False,
+                          instrument=instrument)
+            seconds, _ = timed(spych.mix, duration=duration)
+            stages['mix'] = {'seconds': seconds, 'audio_per_second': duration / seconds, 'peak': peak_memory()}
+        return stages
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def gtts_case(size: int, concurrency: int, latency: float=LATENCY) -> dict:
+    """
+    record synthetic subtitles with gtts_async from the local server, in a temporary working directory
+    :param int size:
+        number of sequences
+    :param int concurrency:
+        maximum number of requests in flight
+    :param float latency:
+        delay in seconds of each answer of the server
+    :return dict:
+        seconds, throughput, requests and failed sequences
+    """
+    sys.path.insert(0, ROOT)
+    from files import File
+    from subtitles import Subtitles
+
+    work = tempfile.mkdtemp(prefix='spych-benchmark-')
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        os.makedirs('videos/bench', exist_ok=True)
+        file = os.path.join(work, 'videos', 'bench', 'bench.srt')
+        write_subtitles(file, size)
+        subtitles = Subtitles(File(file, find=False))
+        with LocalServer(latency) as server:
+            seconds, _ = timed(subtitles.speech, mode='gtts_async', concurrency=concurrency, url=server.url,
+                               retries=0)
+        return {'seconds': seconds, 'per_second': size / seconds, 'requests': server.requests,
+                'failed': len(subtitles.failed)}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def check_gtts(size: int, concurrencies=CONCURRENCY, latency: float=LATENCY) -> dict:
+    """
+    benchmark gtts_async at each concurrency
+    :return dict:
+        result of each concurrency, or the error if aiohttp or gtts is missing
+    """
+    try:
+        import aiohttp
+        import gtts
+    except ImportError as e:
+        print(f'gtts_async not benchmarked : {e}')
+        return {'error': str(e)}
+    results = {}
+    for concurrency in concurrencies:
+        result = results[str(concurrency)] = gtts_case(size, concurrency, latency=latency)
+        print(f'  gtts_async {size} sequences, concurrency {concurrency:<3} {result["seconds"]:9.3f}s '
+              f'{result["per_second"]:8.1f} sequences/s, {result["requests"]} requests, {result["failed"]} failed')
+    return results
+
+
+def check_fetch(size: int, parts: int=PARTS) -> dict:
+    """
+    download a file from the local server in byte ranges, then interrupt a download in the middle of a range
+    and resume it
+    :param int size:
+        size of the file in MiB
+    :param int parts:
+        number of byte ranges
+    :return dict:
+        seconds and throughput of the download, bytes fetched again by the resume and the checks of the content
+    """
+    sys.path.insert(0, ROOT)
+    import fetch
+
+    data = np.random.default_rng(0).bytes(size << 20)
+    work = tempfile.mkdtemp(prefix='spych-benchmark-')
+    try:
+        with LocalServer(data=data) as server:
+            file = os.path.join(work, 'video.mp4')
+            seconds, download = timed(fetch.RangedDownload(server.url, file, parts=parts).run)
+            with open(file, 'rb') as f:
+                complete = f.read() == data
+
+            file = os.path.join(work, 'interrupted.mp4')
+            server.cut = 1
+            interrupted = fetch.RangedDownload(server.url, file, parts=parts)
+            try:
+                interrupted.run()
+            except Exception as e:
+                print(f'  download interrupted : {type(e).__name__}: {e}')
+            resumed = fetch.RangedDownload(server.url, file, parts=parts)
+            resumed.run()
+            with open(file, 'rb') as f:
+                resumed_complete = f.read() == data
+
+        result = {'seconds': seconds, 'mib_per_second': size / seconds, 'complete': complete,
+                  'interrupted_bytes': interrupted.downloaded, 'resumed_bytes': resumed.downloaded,
+                  'resumed_complete': resumed_complete,
+                  'passed': complete and resumed_complete and resumed.downloaded < len(data)}
+        print(f'  download {size} MiB in {parts} ranges {seconds:9.3f}s {result["mib_per_second"]:8.1f} MiB/s, '
+              f'resumed with {resumed.downloaded} of {len(data)} bytes'
+              + ('' if result['passed'] else ' FAILED'))
+        return result
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def import_time(module: str='spych', repeat: int=5) -> dict:
+    """
+    measure the import of a module, each time in a new interpreter
+    :param str module:
+        name of the module
+    :param int repeat:
+        number of imports, the fastest one is kept
+    :return dict:
+        seconds of the fastest import and the lazy modules it imported
+    """
+    code = (f'import sys, time, json\n'
+            f'start = time.perf_counter()\n'
+            f'import {module}\n'
+            f'seconds = time.perf_counter() - start\n'
+            f'print(json.dumps([seconds, sorted(m for m in {LAZY_MODULES!r} if m in sys.modules)]))')
+    times, eager = [], []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, stdout=subprocess.PIPE, check=True).stdout
+        seconds, eager = json.loads(output.decode().strip().splitlines()[-1])
+        times.append(seconds)
+    return {'seconds': min(times), 'eager': eager}
+
+
+def check_imports(budget: float=IMPORT_BUDGET) -> dict:
+    """
+    check the import of spych against the budget and the lazy dependencies
+    :param float budget:
+        seconds the import may take
+    :return dict:
+        seconds, eager modules, budget and "passed"
+    """
+    result = import_time('spych')
+    result.update(budget=budget, passed=result['seconds'] <= budget and not result['eager'])
+    print(f'import spych {result["seconds"] * 1000:.1f} ms (budget {budget * 1000:.0f} ms)'
+          + (f', imported {", ".join(result["eager"])} which should be loaded on first use' if result['eager'] else '')
+          + ('' if result['passed'] else ' FAILED'))
+    return result
+
+
+def commit() -> str:
+    """current commit of the repository, "unknown" outside of git"""
+    try:
+        output = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, check=True).stdout
+        return output.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run(sizes=SIZES, formats=FORMATS, max_speech: int=MAX_SPEECH, output: str='',
+        import_budget: float=IMPORT_BUDGET, packed: bool=False, gtts: int=0, concurrencies=CONCURRENCY,
+        fetch: int=0) -> dict:
+    """
+    run every case in its own process and save the results
+    :param sizes:
+        numbers of sequences
+    :param formats:
+        extensions of the subtitles
+    :param int max_speech:
+        biggest size whose speeches are rendered and mixed
+    :param str output:
+        json file of the results, named after the commit in the benchmarks directory by default
+    :param float import_budget:
+        seconds the import of spych may take
+    :param bool packed:
+        keep the speeches in the packed store instead of one file per sequence
+    :param int gtts:
+        number of sequences recorded with gtts_async from the local server, 0 to skip it
+    :param concurrencies:
+        concurrencies of gtts_async
+    :param int fetch:
+        size in MiB of the ranged download from the local server, 0 to skip it
+    :return dict:
+        results
+    """
+    results = {'commit': commit(), 'time': time.time(), 'python': platform.python_version(),
+               'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+               'packed': packed, 'import': check_imports(import_budget), 'cases': {}}
+    for size in sizes:
+        for extension in formats:
+            name = f'{size}{extension}'
+            print(f'Benchmarking {name}')
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                case_file = f.name
+            try:
+                process = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', str(size), extension,
+                                          '--max-speech', str(max_speech), '--case-output', case_file]
+                                         + (['--packed'] if packed else []),
+                                         stdout=subprocess.DEVNULL)
+                if process.returncode:
+                    results['cases'][name] = {'error': f'exit code {process.returncode}'}
+                else:
+                    with open(case_file, 'r') as f:
+                        results['cases'][name] = json.load(f)
+            finally:
+                os.remove(case_file)
+            print_case(name, results['cases'][name])
+
+    if gtts:
+        print('Benchmarking gtts_async with a local server')
+        results['gtts'] = check_gtts(gtts, concurrencies)
+    if fetch:
+        print('Benchmarking the ranged download with a local server')
+        results['fetch'] = check_fetch(fetch)
+
+    output = output or os.path.join(RESULTS_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{results["commit"]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f'Results saved in {output}')
+    return results
+
+
+def print_case(name: str, stages: dict, previous: dict=None):
+    """print the stages of a case, with the ratio to a previous run"""
+    if 'error' in stages:
+        print(f'  {name:<12} failed : {stages["error"]}')
+        return
+    for stage, result in stages.items():
+        peak = f'{result["peak"] / 2 ** 20:8.1f} MiB' if result['peak'] is not None else '       - MiB'
+        line = f'  {name:<12} {stage:<14} {result["seconds"]:9.3f}s {peak}'
+        if previous and stage in previous.get(name, {}):
+            line += f'  x{result["seconds"] / max(previous[name][stage]["seconds"], 1e-9):.2f} time'
+        print(line)
+
+
+def compare(results: dict, file: str):
+    """print the time of each stage relative to a previous run"""
+    with open(file, 'r') as f:
+        previous = json.load(f)
+    print(f'Compared to {previous["commit"]} (x1.00 is the same time, lower is faster)')
+    if 'import' in previous:
+        print(f'  import spych x{results["import"]["seconds"] / max(previous["import"]["seconds"], 1e-9):.2f} time')
+    for name, stages in results['cases'].items():
+        print_case(name, stages, previous['cases'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='offline benchmarks of the Spych pipeline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='numbers of sequences')
+    parser.add_argument('--formats', nargs='+', default=FORMATS, help='extensions of the subtitles')
+    parser.add_argument('--max-speech', type=int, default=MAX_SPEECH, help='biggest size whose speeches are rendered')
+    parser.add_argument('--output', default='', help='json file of the results')
+    parser.add_argument('--compare', default='', help='json file of a previous run')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET,
+                        help='seconds "import spych" may take')
+    parser.add_argument('--packed', action='store_true', help='keep the speeches in the packed store')
+    parser.add_argument('--gtts', type=int, default=0,
+                        help='number of sequences recorded with gtts_async from a local server, 0 to skip it')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=CONCURRENCY, help='concurrencies of gtts_async')
+    parser.add_argument('--fetch', type=int, default=0,
+                        help='MiB downloaded in byte ranges from a local server, 0 to skip it')
+    parser.add_argument('--imports-only', action='store_true', help='only check the import of spych')
+    parser.add_argument('--case', nargs=2, help=argparse.SUPPRESS)
+    parser.add_argument('--case-output', help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+
+    if arguments.case:
+        stages = run_case(int(arguments.case[0]), arguments.case[1], max_speech=arguments.max_speech,
+                          packed=arguments.packed)
+        with open(arguments.case_output, 'w') as f:
+            json.dump(stages, f)
+        return
+
+    if arguments.imports_only:
+        sys.exit(0 if check_imports(arguments.import_budget)['passed'] else 1)
+
+    results = run(arguments.sizes, arguments.formats, max_speech=arguments.max_speech, output=arguments.output,
+                  import_budget=arguments.import_budget, packed=arguments.packed, gtts=arguments.gtts,
+                  concurrencies=arguments.concurrency, fetch=arguments.fetch)
+    if arguments.compare:
+        compare(results, arguments.compare)
+    if not results['import']['passed'] or not results.get('fetch', {'passed': True})['passed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
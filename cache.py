@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Cache file include AudioCache class, a content addressed cache of the recorded speeches,
+and MetadataCache class, a cache of the youtube searches, streams and captions
+"""
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import unicodedata
+from collections import OrderedDict
+import config
+
+
+class AudioCache:
+    """persistent cache of recorded speeches keyed by a hash of what was spoken and how, with a LRU eviction"""
+
+    def __init__(self, path: str=config.CACHE_DIR, size: int=config.CACHE_SIZE):
+        """
+        Construct a :class:`AudioCache <AudioCache>`.
+        :param str path:
+            directory of the cache
+        :param int size:
+            maximum size of the cache in bytes
+        """
+        self.path = os.path.abspath(path)
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+
+        # key -> size in bytes, least recently used first
+        self.entries = OrderedDict()
+        self.total = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        self.load()
+
+    def load(self):
+        """index the files already in the cache, the modification time is the last use"""
+        files = []
+        for root, dirnames, filenames in os.walk(self.path):
+            for filename in filenames:
+                if filename.endswith('.audio'):
+                    stat = os.stat(os.path.join(root, filename))
+                    files.append((stat.st_mtime, filename[:-len('.audio')], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total += size
+
+    @staticmethod
+    def key(engine: str, voice, language: str, rate, text: str) -> str:
+        """
+        hash the parameters of a speech
+        :param str engine:
+            "pyttsx3" or "gtts"
+        :param voice:
+            voice of the engine or None for the default one
+        :param str language:
+            language of the speech
+        :param rate:
+            rate of the speech or None if the engine has no rate
+        :param str text:
+            text of the speech
+        :return str:
+            hexadecimal key
+        """
+        text = re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text)).strip()
+        rate = round(float(rate), 2) if rate is not None else None
+        data = json.dumps([engine, voice, language, rate, text], ensure_ascii=False)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def file(self, key: str) -> str:
+        """
+        get the location of the cached speech
+        :param str key:
+            key of the speech
+        """
+        return os.path.join(self.path, key[:2], f'{key}.audio')
+
+    def get(self, key: str, destination: str) -> bool:
+        """
+        serve a cached speech by hardlink, or by copy if the link is not possible
+        :param str key:
+            key of the speech
+        :param str destination:
+            file where the speech is expected
+        :return bool:
+            the speech was in the cache
+        """
+        if key not in self.entries:
+            self.misses += 1
+            return False
+
+        file = self.file(key)
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(file, destination)
+        except FileNotFoundError:
+            # removed by someone else
+            self.total -= self.entries.pop(key)
+            self.misses += 1
+            return False
+        except OSError:
+            shutil.copyfile(file, destination)
+
+        os.utime(file)
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True
+
+    def put(self, key: str, source: str):
+        """
+        add a recorded speech to the cache
+        :param str key:
+            key of the speech
+        :param str source:
+            recorded speech file
+        """
+        file = self.file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+
+        # the source is copied, not linked, so writing over it later does not alter the cache
+        temp = f'{file}.{os.getpid()}.tmp'
+        shutil.copyfile(source, temp)
+        os.replace(temp, file)
+
+        size = os.path.getsize(file)
+        self.total += size - self.entries.pop(key, 0)
+        self.entries[key] = size
+        self.evict()
+
+    def evict(self):
+        """remove the least recently used speeches until the cache fits in its size"""
+        while self.total > self.size and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total -= size
+            try:
+                os.remove(self.file(key))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f'AudioCache(path={self.path}, size={self.total}/{self.size}, hits={self.hits}, misses={self.misses})'
+
+
+class MetadataCache:
+    """persistent cache of the youtube metadata, by section and key, with a time to live"""
+
+    def __init__(self, file: str=config.METADATA_CACHE, ttl: float=config.METADATA_TTL):
+        """
+        Construct a :class:`MetadataCache <MetadataCache>`.
+        :param str file:
+            json file of the cache
+        :param float ttl:
+            default time to live of the entries in seconds
+        """
+        self.file = os.path.abspath(file)
+        self.ttl = ttl
+        self.data = {}
+        self.load()
+
+    def load(self):
+        """load the cache file"""
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.data = {}
+
+    def save(self):
+        """save the cache file, merging the entries saved by other processes meanwhile"""
+        data = self.data
+        self.load()
+        for section, entries in data.items():
+            self.data.setdefault(section, {}).update(entries)
+
+        os.makedirs(os.path.dirname(self.file), exist_ok=True)
+        temp = f'{self.file}.{os.getpid()}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(temp, self.file)
+
+    def get(self, section: str, key: str):
+        """
+        get an entry which has not expired
+        :param str section:
+            "search", "streams", "captions" or "media"
+        :param str key:
+            query or video id
+        :return:
+            the value or None
+        """
+        entry = self.data.get(section, {}).get(key)
+        if not entry or (entry['expires'] is not None and entry['expires'] < time.time()):
+            return None
+        return entry['value']
+
+    def set(self, section: str, key: str, value, ttl=-1):
+        """
+        set an entry and save the cache
+        :param str section:
+            "search", "streams", "captions" or "media"
+        :param str key:
+            query or video id
+        :param value:
+            json serializable value
+        :param ttl:
+            time to live in seconds, None never expires, -1 for the default time to live
+        """
+        ttl = self.ttl if ttl == -1 else ttl
+        self.data.setdefault(section, {})[key] = {'value': value,
+                                                  'expires': time.time() + ttl if ttl is not None else None}
+        self.save()
+
+    def __repr__(self):
+        return f'MetadataCache(file={self.file}, entries={sum(len(e) for e in self.data.values())})'
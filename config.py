@@ -7,3 +7,9 @@ VID_DIR_NAME = 'videos'
 SUB_DIR_NAME = 'subtitles'
 SUB_EXT = ('.srt', '.vtt',)
 VID_EXT = ('.mp4', '.avi',)
+CACHE_DIR = 'cache'
+CACHE_SIZE = 2 ** 30
+GTTS_URL = 'https://translate.google.com/_/TranslateWebserverUi/data/batchexecute'
+METADATA_CACHE = 'cache/metadata.json'
+METADATA_TTL = 6 * 60 * 60
+TTS_SOCKET = 'cache/tts.sock'
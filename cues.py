@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Cues file include Cues class, a columnar table of the sequences of a subtitles file
+"""
+import sys
+from collections import namedtuple
+import numpy as np
+
+
+Sequence = namedtuple('Sequence', ['Index', 'start', 'end', 'text', 'duration', 'words', 'rate', 'recorded', 'ratio'])
+
+
+class Cues:
+    """columnar table of sequences, one numpy array per column and one list of interned texts"""
+
+    columns = ('start', 'end', 'duration', 'words', 'rate', 'recorded', 'ratio')
+
+    def __init__(self, start=(), end=(), text=()):
+        """
+        Construct a :class:`Cues <Cues>`.
+        :param start:
+            start of each sequence in seconds
+        :param end:
+            end of each sequence in seconds
+        :param text:
+            text of each sequence
+        """
+        self.start = np.asarray(start, dtype=np.float64)
+        self.end = np.asarray(end, dtype=np.float64)
+        self.text = [sys.intern(t) for t in text]
+
+        if not len(self.start) == len(self.end) == len(self.text):
+            raise ValueError('start, end and text must have the same length')
+
+        n = len(self.text)
+        self.duration = self.end - self.start
+        self.words = np.zeros(n, dtype=np.int32)
+        self.rate = np.full(n, np.nan, dtype=np.float32)
+        self.recorded = np.full(n, np.nan, dtype=np.float32)
+        self.ratio = np.full(n, np.nan, dtype=np.float32)
+
+    @property
+    def index(self):
+        """number of each sequence"""
+        return np.arange(len(self))
+
+    @property
+    def graded(self) -> bool:
+        """the recorded length of every sequence is known"""
+        return len(self) > 0 and not np.isnan(self.ratio).any()
+
+    def to_pandas(self):
+        """
+        export the table into a pandas dataframe
+        :return: DataFrame indexed by the sequence number
+        """
+        import pandas as pd
+
+        df = pd.DataFrame({column: getattr(self, column) for column in self.columns})
+        df.insert(2, 'text', self.text)
+        df.index.name = 'n'
+        return df
+
+    def __iter__(self):
+        """iter the sequences as named tuples"""
+        return map(Sequence._make, zip(range(len(self)), self.start.tolist(), self.end.tolist(), self.text,
+                                       self.duration.tolist(), self.words.tolist(), self.rate.tolist(),
+                                       self.recorded.tolist(), self.ratio.tolist()))
+
+    def __getitem__(self, i):
+        """get the sequence number i"""
+        i = range(len(self))[i]
+        return Sequence(i, float(self.start[i]), float(self.end[i]), self.text[i], float(self.duration[i]),
+                        int(self.words[i]), float(self.rate[i]), float(self.recorded[i]), float(self.ratio[i]))
+
+    def __len__(self):
+        """get the number of sequences"""
+        return len(self.text)
+
+    def __repr__(self):
+        return f'Cues(n={len(self)}, graded={self.graded})'
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Daemon file include the speech daemon, a long lived process whose workers keep their pyttsx3 engines warm
+and render the sequences sent by every Spych process over a local unix socket, and the Client of the daemon
+
+usage : python daemon.py --workers 2
+the requests and the responses are json lines,
+{"jobs": [[n, text, rate, file], ...], "voice": id} is answered by {"errors": {n: message}}
+"""
+import os
+import sys
+import json
+import socket
+import signal
+import argparse
+import socketserver
+from concurrent.futures import ProcessPoolExecutor
+import config
+import synthesis
+
+
+class Handler(socketserver.StreamRequestHandler):
+    """answer the requests of one connection"""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request.get('ping'):
+                    response = {'workers': self.server.workers}
+                else:
+                    response = {'errors': self.server.speech(request['jobs'], voice=request.get('voice'))}
+            except Exception as e:
+                response = {'error': f'{type(e).__name__}: {e}'}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class Daemon(socketserver.ThreadingUnixStreamServer):
+    """speech daemon, the requests of all the clients share its pool of warm engines"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str=config.TTS_SOCKET, workers: int=2, voice=None):
+        """
+        Construct a :class:`Daemon <Daemon>`.
+        :param str path:
+            file of the unix socket
+        :param int workers:
+            number of worker processes, the number of sequences rendered at once by all the clients
+        :param voice:
+            id of the voice the workers are warmed with, None for the default one
+        """
+        self.path = path
+        self.workers = workers
+        if os.path.exists(path):
+            if Client(path).available():
+                raise OSError(f'a speech daemon already listens on {path}')
+            # socket left by a daemon which did not stop cleanly
+            os.remove(path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=synthesis.init_pyttsx3, initargs=(voice,))
+        # start the workers and their engines now rather than on the first request
+        for future in [self.pool.submit(synthesis.speech_pyttsx3, []) for _ in range(workers)]:
+            future.result()
+        super().__init__(path, Handler)
+
+    def speech(self, jobs: list, voice=None) -> dict:
+        """
+        render sequences in shards over the workers
+        :param list jobs:
+            list of (n, text, rate, file) of the sequences to render, the files are absolute
+        :param voice:
+            id of the voice, None for the one of the workers
+        :return dict:
+            error message of each failed sequence by number
+        """
+        errors = {}
+        for shard in synthesis.submit(self.pool, jobs, self.workers, voice=voice):
+            errors.update(shard.result())
+        return errors
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __repr__(self):
+        return f'Daemon(path={self.path}, workers={self.workers})'
+
+
+class Client:
+    """client of the speech daemon"""
+
+    def __init__(self, path: str=config.TTS_SOCKET, timeout: float=None):
+        """
+        Construct a :class:`Client <Client>`.
+        :param str path:
+            file of the unix socket of the daemon
+        :param float timeout:
+            seconds to wait for an answer, None to wait as long as the rendering takes
+        """
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, request: dict) -> dict:
+        """send a request to the daemon and return its answer"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.settimeout(self.timeout)
+            try:
+                connection.connect(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                raise ConnectionError(f'no speech daemon on {self.path}, start it with "python daemon.py"')
+            connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with connection.makefile('rb') as f:
+                line = f.readline()
+        if not line:
+            raise ConnectionError(f'the speech daemon on {self.path} closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(f'speech daemon : {response["error"]}')
+        return response
+
+    def available(self) -> bool:
+        """a daemon answers on the socket"""
+        try:
+            self.request({'ping': True})
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def speech(self, jobs: list, voice=None) -> dict:
+        """
+        render sequences with the daemon
+        :param list jobs:
+            list of (n, text, rate, file) of the sequences to render
+        :param voice:
+            id of the voice, None for the one of the daemon
+        :return dict:
+            error message of each failed sequence by number
+        """
+        jobs = [(n, text, rate, os.path.abspath(file)) for n, text, rate, file in jobs]
+        errors = self.request({'jobs': jobs, 'voice': voice})['errors']
+        return {int(n): error for n, error in errors.items()}
+
+    def __repr__(self):
+        return f'Client(path={self.path})'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='speech daemon shared by the Spych processes')
+    parser.add_argument('--socket', default=config.TTS_SOCKET, help='file of the unix socket')
+    parser.add_argument('--workers', type=int, default=2, help='number of worker processes')
+    parser.add_argument('--voice', default=None, help='id of the voice the workers are warmed with')
+    arguments = parser.parse_args(argv)
+
+    # stop cleanly, removing the socket, when killed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with Daemon(arguments.socket, workers=arguments.workers, voice=arguments.voice) as daemon:
+        print(f'Speech daemon listening on {arguments.socket} with {arguments.workers} workers')
+        try:
+            daemon.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            print('Speech daemon stopped')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,72 +1,231 @@
 """search and download from youtube video and subtitles"""
-from pytube import YouTube
-from pytube.helpers import safe_filename
-from files import SpychDirectory
+from cache import MetadataCache
+from files import Directory, File, video_directory
 from random import choice
+import urllib.parse
 import unicodedata
+import threading
+import html
+import time
+import os
+
+
+def parse_captions(xml: str) -> list:
+    """
+    parse youtube xml captions into sequences
+    :param str xml:
+        xml captions, timed text format 3 (<p t="ms" d="ms">) or legacy (<text start="s" dur="s">)
+    :return list:
+        sequences (start, end, text) in seconds with their text NFC normalized
+    """
+    import xml.etree.ElementTree as ElementTree
+
+    root = ElementTree.fromstring(xml)
+    cues = []
+    for child in root.iter():
+        if child.tag == 'p' and 't' in child.attrib:
+            start = float(child.attrib['t']) / 1000
+            duration = float(child.attrib.get('d', 0)) / 1000
+        elif child.tag == 'text' and 'start' in child.attrib:
+            start = float(child.attrib['start'])
+            duration = float(child.attrib.get('dur', 0))
+        else:
+            continue
+        text = html.unescape(' '.join(''.join(child.itertext()).split()))
+        if text:
+            cues.append((start, start + duration, unicodedata.normalize('NFC', text)))
+    return cues
+
+
+def write_srt(file: str, cues: list):
+    """
+    write sequences into a srt file
+    :param str file:
+        srt file full name
+    :param list cues:
+        sequences (start, end, text) in seconds
+    """
+    def timestamp(seconds):
+        milliseconds = int(round(seconds * 1000))
+        h, milliseconds = divmod(milliseconds, 3600000)
+        m, milliseconds = divmod(milliseconds, 60000)
+        s, milliseconds = divmod(milliseconds, 1000)
+        return f'{h:02}:{m:02}:{s:02},{milliseconds:03}'
+
+    temp = f'{file}.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        for n, (start, end, text) in enumerate(cues):
+            f.write(f'{n + 1}\n{timestamp(start)} --> {timestamp(end)}\n{text}\n\n')
+    os.replace(temp, file)
 
 
 class Download:
     """download class"""
 
-    def __init__(self, query: str, langs=('en', 'fr')):
+    def __init__(self, query: str, langs=('en', 'fr'), directory: Directory=None, video_name: str='',
+                 subtitles_name: str='', metadata: MetadataCache=None):
+        """
+        Construct a :class:`Download <Download>`.
+        :param str query:
+            youtube search terms
+        :param langs:
+            languages of the subtitles in order of preference
+        :param Directory directory:
+            directory of the downloaded files, a directory named after the video by default
+        :param str video_name:
+            name of the video file without extension, the name of the directory by default
+        :param str subtitles_name:
+            name of the subtitles file without extension, the name of the directory by default
+        :param MetadataCache metadata:
+            cache of the searches, streams and captions, the default cache if None
+        """
         self.url = None
+        self.video_id = None
         self.langs = list(langs)
-        self.yt = None
-        self.directory = None
+        self._yt = None
+        self.directory = directory
         self.name = None
         self.subtitles = None
         self.videos = None
+        self.video_name = video_name
+        self.subtitles_name = subtitles_name
+        self.metadata = metadata or MetadataCache()
+
+        self.video_file = None
+        self.subtitles_file = None
+        self.cues = None
+        self.subtitles_writer = None
+        self.downloaded = 0
 
         self.video_downloaded = False
         self.subtitle_downloaded = False
 
         self.search(query)
 
+    @property
+    def yt(self):
+        """YouTube object of the video, only built when the cache cannot answer"""
+        if not self._yt:
+            from pytube import YouTube
+
+            self._yt = YouTube(self.url)
+        return self._yt
+
     def search(self, query: str):
         """search an url with a string"""
-        from youtubesearchpython import VideosSearch
+        infos = self.metadata.get('search', query)
 
-        response = VideosSearch(query, limit=1)
+        if not infos:
+            from youtubesearchpython import VideosSearch
 
-        if len(response.result()["result"]) == 0:
-            raise Exception(f'did not find any videos named {query}')
+            response = VideosSearch(query, limit=1)
+            result = response.result()["result"]
 
-        if not self.langs:
-            self.langs.append(response.language)
+            if len(result) == 0:
+                raise Exception(f'did not find any videos named {query}')
+
+            infos = {'link': result[0]["link"], 'id': result[0]["id"], 'title': result[0]["title"],
+                     'language': response.language}
+            self.metadata.set('search', query, infos)
 
-        infos = response.result()["result"][0]
+        from pytube.helpers import safe_filename
+
+        if not self.langs:
+            self.langs.append(infos['language'])
 
         self.url = infos["link"]
-        self.yt = YouTube(self.url)
-        self.name = safe_filename(self.yt.title)
+        self.video_id = infos["id"]
+        self.name = safe_filename(infos["title"])
         print(f'Video {self.name} ({self.url}) found')
 
-        self.directory = SpychDirectory(self.name, create=True)
-
-    def dl(self, lang_code=None, itag=None, file_extension='mp4', skip_existing=True, res=0):
+        # files already downloaded for this video, whatever the directory they were saved in
+        media = self.metadata.get('media', self.video_id) or {}
+        if not self.directory and media.get('directory') and os.path.isdir(media['directory']):
+            self.directory = Directory(media['directory'], find=False, create=False)
+        if not self.directory:
+            self.directory = video_directory(self.name, find=True, create=True)
+        self.video_name = self.video_name or self.directory.name
+        self.subtitles_name = self.subtitles_name or self.directory.name
+
+    def save_media(self, **files):
+        """
+        remember the downloaded files of the video
+        :param files:
+            "video" or "subtitles" file
+        """
+        media = self.metadata.get('media', self.video_id) or {}
+        media.update(directory=str(self.directory), **files)
+        self.metadata.set('media', self.video_id, media, ttl=None)
+
+    def existing_media(self, kind: str):
+        """
+        get a file of the video downloaded by a previous run
+        :param str kind:
+            "video" or "subtitles"
+        :return:
+            file full name or None
+        """
+        file = (self.metadata.get('media', self.video_id) or {}).get(kind)
+        if file and os.path.isfile(file) and not os.path.exists(f'{file}.part.json'):
+            return file
+        return None
+
+    def dl(self, lang_code=None, itag=None, file_extension='mp4', skip_existing=True, res=0, parts=8):
         if not (skip_existing and self.subtitle_downloaded):
-            self.subtitle(lang_code=lang_code)
+            self.subtitle(lang_code=lang_code, skip_existing=skip_existing)
         if not (skip_existing and self.video_downloaded):
-            self.video(itag=itag, only_video=self.subtitle_downloaded, file_extension=file_extension, skip_existing=skip_existing, res=res)
+            self.video(itag=itag, only_video=self.subtitle_downloaded, file_extension=file_extension,
+                       skip_existing=skip_existing, res=res, parts=parts)
+
+    def get_streams(self) -> list:
+        """
+        get the manifest of the streams of the video, from the cache while their urls have not expired
+        :return list:
+            itag, type, resolution, fps, subtype, audio, video and url of every stream
+        """
+        streams = self.metadata.get('streams', self.video_id)
+        if streams is None:
+            streams = [{'itag': stream.itag, 'type': stream.type, 'resolution': stream.resolution,
+                        'fps': getattr(stream, 'fps', None), 'subtype': stream.subtype,
+                        'audio': stream.includes_audio_track, 'video': stream.includes_video_track,
+                        'url': stream.url} for stream in self.yt.streams]
+            # the urls of the streams are signed until their expire parameter
+            expires = [int(urllib.parse.parse_qs(urllib.parse.urlsplit(s['url']).query).get('expire', [0])[0])
+                       for s in streams]
+            ttl = self.metadata.ttl
+            if any(expires):
+                ttl = min(ttl, min(e for e in expires if e) - time.time() - 60)
+            if ttl > 0:
+                self.metadata.set('streams', self.video_id, streams, ttl=ttl)
+        return streams
 
     def get_videos(self, only_video=True, file_extension='mp4', full_disp=True):
-        self.videos = self.yt.streams.filter(
-            only_video=only_video,
-            file_extension=file_extension
-        ).order_by('resolution')
+        self.videos = sorted((s for s in self.get_streams()
+                              if s['resolution'] and s['subtype'] == file_extension
+                              and (not only_video or not s['audio'])),
+                             key=lambda s: int(s['resolution'].rstrip('p')))
         print(f'Found {len(self.videos)} video files for "{self.name}"')
         if full_disp:
             for n, video in enumerate(self.videos):
-                print(f'{video.type} {n+1}: '
-                      f'itag={video.itag} '
-                      f'res={video.resolution} '
-                      f'fps={video.fps} '
-                      f'extension={video.subtype} '
-                      f'audio={video.includes_audio_track}')
-
-    def video(self, itag=None, only_video=True, file_extension='mp4', skip_existing=True, res=0):
-        """download video"""
+                print(f'{video["type"]} {n+1}: '
+                      f'itag={video["itag"]} '
+                      f'res={video["resolution"]} '
+                      f'fps={video["fps"]} '
+                      f'extension={video["subtype"]} '
+                      f'audio={video["audio"]}')
+
+    def video(self, itag=None, only_video=True, file_extension='mp4', skip_existing=True, res=0, parts=8):
+        """
+        download video
+        :param int parts:
+            number of byte ranges downloaded concurrently, 1 lets pytube download over one connection
+        """
+        existing = self.existing_media('video') if skip_existing else None
+        if existing:
+            self.video_file = File(existing, find=False)
+            self.video_downloaded = True
+            print(f'The video {self.name} is already downloaded')
+            return
 
         print(f'Downloading the video "{self.name}" from {self.url}')
 
@@ -74,56 +233,87 @@ class Download:
             self.get_videos(only_video=only_video, file_extension=file_extension, full_disp=False)
 
         if itag:
-            video = self.videos.itag_index[itag]
+            video = next(v for v in self.videos if v['itag'] == itag)
         else:
             video = self.videos[res]
 
-        video.download(output_path=str(self.directory), filename=self.directory.name, skip_existing=skip_existing)
+        if parts > 1:
+            file = os.path.join(str(self.directory), f'{self.video_name}.{video["subtype"]}')
+            complete = os.path.exists(file) and not os.path.exists(f'{file}.part.json')
+            if not (skip_existing and complete):
+                import fetch
+
+                loader = fetch.RangedDownload(video['url'], file, parts=parts)
+                loader.run()
+                self.downloaded += loader.downloaded
+        else:
+            file = self.yt.streams.get_by_itag(video['itag']).download(
+                output_path=str(self.directory), filename=f'{self.video_name}.{video["subtype"]}',
+                skip_existing=skip_existing)
+            self.downloaded += os.path.getsize(file)
+        self.video_file = File(file, find=False)
+        self.save_media(video=file)
 
         self.video_downloaded = True
 
         print(f'The video {self.name} has been downloaded')
 
     def get_subtitles(self, full_disp=True):
-        """get the list of all subtitles"""
-        self.subtitles = self.yt.captions
+        """get the list of all subtitles, from the cache if possible"""
+        self.subtitles = self.metadata.get('captions', self.video_id)
+        if self.subtitles is None:
+            self.subtitles = [{'code': caption.code, 'name': caption.name} for caption in self.yt.captions]
+            self.metadata.set('captions', self.video_id, self.subtitles)
         print(f'Found {len(self.subtitles)} subtitles files')
         if full_disp:
             for n, subtitle in enumerate(self.subtitles):
                 print(f'subtitle {n+1}: '
-                      f'code={subtitle.code} '
-                      f'name="{subtitle.name}"')
+                      f'code={subtitle["code"]} '
+                      f'name="{subtitle["name"]}"')
 
-    def subtitle(self, lang_code=None):
+    def subtitle(self, lang_code=None, skip_existing=True):
         """download subtitles"""
 
-        if not self.subtitles:
+        existing = self.existing_media('subtitles') if skip_existing else None
+        if existing:
+            self.subtitles_file = File(existing, find=False)
+            self.subtitle_downloaded = True
+            print(f'The subtitles of {self.name} are already downloaded')
+            return
+
+        if self.subtitles is None:
             self.get_subtitles(full_disp=False)
 
         subtitle = None
         codes = ([lang_code] if lang_code else [])
         codes = codes + self.langs + [f'a.{l}' for l in self.langs]
         if self.subtitles:
+            tracks = {track['code']: track for track in self.subtitles}
             for code in codes:
-                try:
-                    subtitle = self.subtitles[code]
-                    print(f'Caption {subtitle.name} ({subtitle.code}) found and selected (matching language {code})')
+                if code in tracks:
+                    subtitle = tracks[code]
+                    print(f'Caption {subtitle["name"]} ({subtitle["code"]}) found and selected '
+                          f'(matching language {code})')
                     break
 
-                except KeyError:
-                    pass
-
             if not subtitle:
-                subtitle = choice(list(self.subtitles))
-                print(f'Warning languages not found, choosing first caption : {subtitle.name} ({subtitle.code})')
+                subtitle = choice(self.subtitles)
+                print(f'Warning languages not found, choosing first caption : {subtitle["name"]} ({subtitle["code"]})')
+
+            file = os.path.join(str(self.directory), f'{self.subtitles_name}.srt')
+            xml = self.yt.captions[subtitle['code']].xml_captions
+            self.downloaded += len(xml.encode('utf-8'))
+            self.cues = parse_captions(xml)
 
-            with open(f'{self.directory}\\{self.directory.name}.srt', 'w', encoding='utf-8') as f:
-                caption_string = unicodedata.normalize("NFKD", subtitle.generate_srt_captions())
-                f.write(caption_string)
+            # the srt file is only an archive, the sequences are handed to Subtitles from memory
+            self.subtitles_writer = threading.Thread(target=write_srt, args=(file, self.cues))
+            self.subtitles_writer.start()
+            self.subtitles_file = File(file, find=False)
+            self.save_media(subtitles=file)
 
             self.subtitle_downloaded = True
 
-            print(f'The subtitles {subtitle.name} has been downloaded')
+            print(f'The subtitles {subtitle["name"]} has been downloaded')
 
         else:
             print(f'No subtitles found for the video {self.name}')
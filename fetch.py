@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Fetch file include the ranged downloader, which fetches the parts of a file concurrently over pooled connections
+into a preallocated file, and resumes the parts of an interrupted download
+"""
+import os
+import json
+import time
+import threading
+import http.client
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK = 1 << 20
+SAVE_INTERVAL = 1.
+
+
+class Connections(threading.local):
+    """one persistent connection per host and per thread"""
+
+    def __init__(self, timeout: float=30):
+        self.timeout = timeout
+        self.connections = {}
+
+    def request(self, url: str, headers: dict=None, method: str='GET', redirects: int=5):
+        """
+        send a request, following the redirections
+        :param str url:
+            url of the request
+        :param dict headers:
+            headers of the request
+        :param str method:
+            method of the request
+        :param int redirects:
+            maximum number of redirections
+        :return:
+            (http.client.HTTPResponse, final url)
+        """
+        for _ in range(redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            key = (parts.scheme, parts.netloc)
+            path = parts.path + (f'?{parts.query}' if parts.query else '')
+            for attempt in range(2):
+                connection = self.connections.get(key)
+                if not connection:
+                    kind = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+                    connection = self.connections[key] = kind(parts.netloc, timeout=self.timeout)
+                try:
+                    connection.request(method, path, headers=headers or {})
+                    response = connection.getresponse()
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    # the server closed the kept alive connection, reconnect once
+                    connection.close()
+                    del self.connections[key]
+                    if attempt:
+                        raise
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                continue
+            return response, url
+        raise ConnectionError(f'too many redirections for {url}')
+
+    def close(self):
+        """close the connections of this thread"""
+        for connection in self.connections.values():
+            connection.close()
+        self.connections = {}
+
+
+class RangedDownload:
+    """download a file in byte ranges fetched concurrently, the progress is saved next to the file"""
+
+    def __init__(self, url: str, file: str, parts: int=8, size: int=None, connections: int=None):
+        """
+        Construct a :class:`RangedDownload <RangedDownload>`.
+        :param str url:
+            url of the file
+        :param str file:
+            destination of the file
+        :param int parts:
+            number of byte ranges
+        :param int size:
+            size of the file in bytes, asked to the server if None
+        :param int connections:
+            number of concurrent connections, parts by default
+        """
+        self.url = url
+        self.file = file
+        self.parts = max(1, parts)
+        self.size = size
+        self.workers = connections or self.parts
+        self.state_file = f'{file}.part.json'
+        self.ranges = []  # [start, end (inclusive), written]
+        self.pool = Connections()
+        self.lock = threading.Lock()
+        self.saved = 0.
+        self.downloaded = 0
+
+    def probe(self) -> bool:
+        """
+        ask the size of the file and if the server accepts ranges
+        :return bool:
+            ranges are accepted
+        """
+        response, self.url = self.pool.request(self.url, headers={'Range': 'bytes=0-0'})
+        if response.status == 206:
+            response.read()
+            total = response.getheader('Content-Range', '').rpartition('/')[2]
+            if total.isdigit():
+                self.size = int(total)
+                return True
+            return False
+
+        # do not read a whole file answered to a range request
+        self.pool.close()
+        if response.status >= 400:
+            raise ConnectionError(f'{response.status} {response.reason} for {self.url}')
+        if response.status == 200 and self.size is None and response.getheader('Content-Length'):
+            self.size = int(response.getheader('Content-Length'))
+        return False
+
+    def load(self):
+        """load the progress of an interrupted download of the same file, or split the file in new ranges"""
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            if state['size'] == self.size and os.path.getsize(self.file) == self.size:
+                self.ranges = state['ranges']
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        step = -(-self.size // self.parts)
+        self.ranges = [[start, min(start + step, self.size) - 1, 0] for start in range(0, self.size, step)]
+        # preallocate the file
+        with open(self.file, 'wb') as f:
+            f.truncate(self.size)
+        self.save(force=True)
+
+    def save(self, force: bool=False):
+        """save the progress, at most every SAVE_INTERVAL seconds"""
+        with self.lock:
+            if not force and time.monotonic() - self.saved < SAVE_INTERVAL:
+                return
+            temp = f'{self.state_file}.tmp'
+            with open(temp, 'w') as f:
+                json.dump({'url': self.url, 'size': self.size, 'ranges': self.ranges}, f)
+            os.replace(temp, self.state_file)
+            self.saved = time.monotonic()
+
+    def fetch(self, part: list):
+        """
+        download the rest of a byte range into its place in the file
+        :param list part:
+            [start, end, written] of the range, written is updated as the data is written
+        """
+        start, end, written = part
+        if start + written > end:
+            return
+        response, _ = self.pool.request(self.url, headers={'Range': f'bytes={start + written}-{end}'})
+        if response.status != 206:
+            response.read()
+            raise ConnectionError(f'{response.status} {response.reason} for the range {start + written}-{end}')
+
+        with open(self.file, 'r+b') as f:
+            f.seek(start + written)
+            while True:
+                data = response.read(min(CHUNK, end + 1 - start - part[2]))
+                if not data:
+                    break
+                f.write(data)
+                # the data must reach the file before the progress says so
+                f.flush()
+                with self.lock:
+                    part[2] += len(data)
+                    self.downloaded += len(data)
+                self.save()
+        if start + part[2] <= end:
+            raise ConnectionError(f'range {start}-{end} interrupted at {start + part[2]}')
+
+    def fetch_whole(self):
+        """download the whole file over one connection when the server does not accept ranges"""
+        response, _ = self.pool.request(self.url)
+        if response.status != 200:
+            raise ConnectionError(f'{response.status} {response.reason} for {self.url}')
+        with open(self.file, 'wb') as f:
+            while True:
+                data = response.read(CHUNK)
+                if not data:
+                    break
+                f.write(data)
+                self.downloaded += len(data)
+
+    def run(self) -> str:
+        """
+        download the file
+        :return str:
+            destination of the file
+        """
+        if not self.probe() or self.size == 0:
+            self.fetch_whole()
+            if self.size is not None and os.path.getsize(self.file) != self.size:
+                raise IOError(f'{self.file} has {os.path.getsize(self.file)} bytes instead of {self.size}')
+            return self.file
+
+        self.load()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for future in [executor.submit(self.fetch, part) for part in self.ranges]:
+                    future.result()
+        finally:
+            self.save(force=True)
+
+        missing = sum(end + 1 - start - written for start, end, written in self.ranges)
+        if missing or os.path.getsize(self.file) != self.size:
+            raise IOError(f'{self.file} is missing {missing} bytes')
+        os.remove(self.state_file)
+        return self.file
+
+    def __repr__(self):
+        return f'RangedDownload(url={self.url}, file={self.file}, size={self.size}, parts={self.parts})'
+
+
+def download(url: str, file: str, parts: int=8, size: int=None, connections: int=None) -> str:
+    """
+    download a file in byte ranges fetched concurrently, resuming an interrupted download of the same file
+    :param str url:
+        url of the file
+    :param str file:
+        destination of the file
+    :param int parts:
+        number of byte ranges
+    :param int size:
+        size of the file in bytes, asked to the server if None
+    :param int connections:
+        number of concurrent connections, parts by default
+    :return str:
+        destination of the file
+    """
+    return RangedDownload(url, file, parts=parts, size=size, connections=connections).run()
@@ -3,10 +3,298 @@
 Files and directory tools
 """
 import os
+import time
 import config
 import re
 
 
+class FileIndex:
+    """
+    index of the video and subtitles files and of the directories under a root, built once with scandir
+    a directory is scanned again only when its modification time changed
+    """
+
+    def __init__(self, root: str='.', skip=(config.CACHE_DIR,), media=config.VID_EXT + config.SUB_EXT,
+                 interval: float=1., retry: float=.1):
+        """
+        Construct a :class:`FileIndex <FileIndex>`.
+        :param str root:
+            root of the index
+        :param skip:
+            paths relative to the root of the directories not indexed, hidden directories are never indexed
+        :param media:
+            extensions with the dot of the files indexed, the speeches and other files are not indexed
+        :param float interval:
+            minimum time in seconds between two checks of the modification times
+        :param float retry:
+            minimum time in seconds between two checks after a miss, which do not wait for interval
+        """
+        self.root = os.path.abspath(root)
+        self.skip = {os.path.join(self.root, normalize(path)) for path in skip}
+        self.media = set(media)
+        self.interval = interval
+        self.retry = retry
+        self.checked = time.monotonic()
+        self.retried = {}  # path checked after a miss -> time of the check
+
+        self.mtimes = {}  # directory -> mtime
+        # the dicts of directories are ordered sets, an entry is removed without a scan of the others
+        self.contents = {}  # directory -> (dirnames, indexed filenames)
+        self.directories = {}  # directory name -> {parent directory: None}
+        self.files = {}  # file name -> {directory: None}
+        self.extensions = {}  # extension -> {directory: file names}
+
+        self.scan(self.root)
+
+    def scan(self, directory: str):
+        """
+        index a directory, its new sub directories and forget its removed sub directories
+        :param str directory:
+            absolute path of the directory
+        """
+        dirnames, filenames = [], []
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.') and os.path.join(directory, entry.name) not in self.skip:
+                            dirnames.append(entry.name)
+                    elif os.path.splitext(entry.name)[1] in self.media:
+                        filenames.append(entry.name)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            self.forget(directory)
+            return
+
+        old_dirnames, _ = self.contents.get(directory, ((), ()))
+        self.unlink(directory)
+        self.mtimes[directory] = mtime
+        self.contents[directory] = (dirnames, filenames)
+
+        for dirname in dirnames:
+            self.directories.setdefault(dirname, {})[directory] = None
+        for filename in filenames:
+            self.files.setdefault(filename, {})[directory] = None
+            extension = os.path.splitext(filename)[1]
+            self.extensions.setdefault(extension, {}).setdefault(directory, []).append(filename)
+
+        for dirname in set(old_dirnames) - set(dirnames):
+            self.forget(os.path.join(directory, dirname))
+        for dirname in dirnames:
+            if os.path.join(directory, dirname) not in self.mtimes:
+                self.scan(os.path.join(directory, dirname))
+
+    def unlink(self, directory: str):
+        """remove the entries of the content of a directory, not of its sub directories"""
+        dirnames, filenames = self.contents.pop(directory, ((), ()))
+        self.mtimes.pop(directory, None)
+        for dirname in dirnames:
+            unindex(self.directories, dirname, directory)
+        for filename in filenames:
+            unindex(self.files, filename, directory)
+            unindex(self.extensions, os.path.splitext(filename)[1], directory)
+
+    def forget(self, directory: str):
+        """remove the entries of a directory and of its sub directories"""
+        dirnames, _ = self.contents.get(directory, ((), ()))
+        self.unlink(directory)
+        for dirname in dirnames:
+            self.forget(os.path.join(directory, dirname))
+
+    def refresh(self, force: bool=False, path: str=None):
+        """
+        scan again the directories whose modification time changed
+        :param bool force:
+            check the modification times after a miss, retry seconds after the last check instead of interval seconds
+        :param str path:
+            absolute path of the directory checked after a miss with its parents and its sub directories,
+            None checks them all
+        """
+        now = time.monotonic()
+        if force:
+            if now - self.retried.get(path, -self.retry) < self.retry:
+                return
+            self.retried[path] = now
+        elif now - self.checked < self.interval:
+            return
+        for directory, mtime in list(self.mtimes.items()):
+            if directory not in self.mtimes or (path and not inside(directory, path) and not inside(path, directory)):
+                continue  # forgotten with its parent, or not involved
+            try:
+                changed = os.stat(directory).st_mtime_ns != mtime
+            except FileNotFoundError:
+                changed = True
+            if changed:
+                self.scan(directory)
+        if not path:
+            self.checked = now
+
+    def recheck(self, directory: str):
+        """
+        scan again a directory whose entry was stale, or its closest parent still existing
+        :param str directory:
+            absolute path of the directory
+        """
+        while not os.path.isdir(directory) and inside(os.path.dirname(directory), self.root) \
+                and os.path.dirname(directory) != directory:
+            directory = os.path.dirname(directory)
+        self.scan(directory)
+
+    def covers(self, path: str) -> bool:
+        """the path is an indexed directory or would be one, inside the root and neither hidden nor skipped"""
+        path = os.path.abspath(path)
+        if not inside(path, self.root):
+            return False
+        relative = os.path.relpath(path, self.root)
+        if relative != '.' and any(part.startswith('.') for part in relative.split(os.sep)):
+            return False
+        return not any(inside(path, skip) for skip in self.skip)
+
+    def find_directory(self, name: str):
+        """
+        find a directory by its name
+        :param str name:
+            name of the directory
+        :return:
+            path of the parent of the directory or None
+        """
+        # a miss checks the modification times again, the directory may have been created since the last check,
+        # a hit is checked too, the directory may have been removed since the last check
+        for force in (False, True):
+            self.refresh(force=force)
+            for parent in list(self.directories.get(name, ())):
+                if os.path.isdir(os.path.join(parent, name)):
+                    return parent
+                self.recheck(parent)
+        return None
+
+    def find_file(self, name: str):
+        """
+        find a file by its name with its extension
+        :param str name:
+            name of the file
+        :return:
+            path of the directory of the file or None
+        """
+        if os.path.splitext(name)[1] not in self.media:
+            # the other files are not indexed
+            for root, dirnames, filenames in os.walk(self.root):
+                if name in filenames:
+                    return root
+            return None
+        for force in (False, True):
+            self.refresh(force=force)
+            for directory in list(self.files.get(name, ())):
+                if os.path.isfile(os.path.join(directory, name)):
+                    return directory
+                self.recheck(directory)
+        return None
+
+    def find_extension(self, extensions, path: str='.', name: str=None):
+        """
+        find a file by its extension under a path
+        :param extensions:
+            extensions with the dot, in order of preference
+        :param str path:
+            directory to search in
+        :param str name:
+            start of the name of the file or None
+        :return:
+            (directory, file name) or None
+        """
+        path = os.path.abspath(path)
+        for force in (False, True):
+            # only the directories under the path are checked after a miss
+            self.refresh(force=force, path=path if force else None)
+            directories = self.subdirectories(path)
+            for extension in extensions:
+                table = self.extensions.get(extension, {})
+                for directory in directories:
+                    for filename in list(table.get(directory, ())):
+                        if not name or filename.startswith(name):
+                            if os.path.isfile(os.path.join(directory, filename)):
+                                return directory, filename
+                            self.recheck(directory)
+        return None
+
+    def subdirectories(self, path: str) -> list:
+        """
+        get an indexed directory and its indexed sub directories, top-down
+        :param str path:
+            absolute path of the directory
+        """
+        directories, stack = [], [path] if path in self.contents else []
+        while stack:
+            directory = stack.pop()
+            directories.append(directory)
+            stack.extend(os.path.join(directory, dirname) for dirname in reversed(self.contents[directory][0])
+                         if os.path.join(directory, dirname) in self.contents)
+        return directories
+
+    def __repr__(self):
+        return f'FileIndex(root={self.root}, directories={len(self.mtimes)})'
+
+
+def inside(path: str, directory: str) -> bool:
+    """
+    the absolute path is the directory or inside it
+    :param str path:
+        absolute path
+    :param str directory:
+        absolute path of the directory
+    """
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+def unindex(table: dict, key: str, directory: str):
+    """
+    remove a directory from the entry of a table of the index, and the entry once empty
+    :param dict table:
+        table of the index
+    :param str key:
+        name or extension
+    :param str directory:
+        absolute path of the directory
+    """
+    directories = table.get(key)
+    if directories is not None:
+        directories.pop(directory, None)
+        if not directories:
+            del table[key]
+
+
+_file_index = None
+
+
+def file_index() -> FileIndex:
+    """return the index of the working directory, built on first use"""
+    global _file_index
+    if not _file_index or _file_index.root != os.path.abspath('.'):
+        _file_index = FileIndex('.')
+    return _file_index
+
+
+def normalize(path: str) -> str:
+    """
+    normalize a path written with / or \\ for the current os
+    :param str path:
+        path to normalize
+    """
+    return os.path.normpath(path.replace('\\', '/'))
+
+
+def split(name: str) -> tuple:
+    """
+    split a path written with / or \\ into its directory and its name
+    :param str name:
+        path to split
+    :return tuple:
+        (path, name)
+    """
+    parts = name.replace('\\', '/').split('/')
+    return normalize('/'.join(parts[:-1])) if len(parts) > 1 else '', parts[-1]
+
+
 class Directory:
     """basic Directory class which helps to play with directories"""
 
@@ -40,7 +328,7 @@ class Directory:
         if not self.path:
             self.path_from_name()
 
-        self.path = self.path.replace('/', '\\') if self.path else '.'
+        self.path = normalize(self.path) if self.path else '.'
 
         if find:
             self.find()
@@ -53,10 +341,9 @@ class Directory:
     def find(self):
         """finds the directory in the sub folders if the file doesn't exists"""
         if not self:
-            directory = self.name
-            for root, dirnames, filenames in os.walk('.'):
-                if directory in dirnames:
-                    self.path = '\\'.join(os.path.split(root)).replace('/', '\\')
+            root = file_index().find_directory(self.name)
+            if root:
+                self.path = root
 
     def create(self):
         """create the directory if it doesn't exists"""
@@ -71,21 +358,16 @@ class Directory:
 
     def path_from_name(self):
         """update path from name information"""
-        temp = self.name.replace('/', '\\').split('\\')
-        self.path = '\\'.join(temp[:-1])
-        self.name = temp[-1]
+        self.path, self.name = split(self.name)
 
     def __str__(self):
         """return the full path
         absolute path directing to the directory"""
-        return f'{self.path}\\{self.name}'
+        return os.path.join(self.path, self.name)
 
     def __bool__(self):
         """the directory exists"""
-        try:
-            return self.name in os.listdir(self.path)
-        except FileNotFoundError:
-            return False
+        return os.path.isdir(str(self))
 
     def __repr__(self):
         return f'Directory({self}, exists={bool(self)})'
@@ -130,7 +412,7 @@ class File:
         if not self.extension:
             self.add_extension()
 
-        self.path = self.path.replace('/', '\\') if self.path else '.'
+        self.path = normalize(self.path) if self.path else '.'
 
         if find:
             self.find()
@@ -141,12 +423,11 @@ class File:
         """finds the file in the sub folders if the file doesn't exists"""
         if not self:
             print(f'File {self} not found')
-            file = self.name + self.extension
-            for root, dirnames, filenames in os.walk('.'):
-                if file in filenames:
-                    self.path = '/'.join(os.path.split(root)).replace('/', '\\')
-                    print(f'Using {self} instead')
-                    return True
+            root = file_index().find_file(self.name + self.extension)
+            if root:
+                self.path = root
+                print(f'Using {self} instead')
+                return True
             return False
 
     def from_class(self, obj):
@@ -156,9 +437,7 @@ class File:
 
     def path_from_name(self):
         """update path from name information"""
-        temp = self.name.replace('/', '\\').split('\\')
-        self.path = '\\'.join(temp[:-1])
-        self.name = temp[-1]
+        self.path, self.name = split(self.name)
 
     def add_extension(self):
         """add extension attribute"""
@@ -169,14 +448,11 @@ class File:
     def __str__(self):
         """return the full path
         absolute path directing to the file"""
-        return f'{self.path}\\{self.name}{self.extension}'
+        return os.path.join(self.path, f'{self.name}{self.extension}')
 
     def __bool__(self):
         """the file exists"""
-        try:
-            return self.name + self.extension in os.listdir(self.path)
-        except FileNotFoundError:
-            return False
+        return os.path.isfile(str(self))
 
     def __repr__(self):
         return f'File({self}, exists={bool(self)})'
@@ -227,12 +503,12 @@ def create_video_directory(path: str=''):
 
 def video_directory(directory_name, find=True, create=True) -> Directory:
     """create and returns a directory object of a directory in the video directory"""
-    return Directory(arg=f'{config.VID_DIR_NAME}\\{directory_name}', find=find, create=create)
+    return Directory(arg=os.path.join(config.VID_DIR_NAME, directory_name), find=find, create=create)
 
 
 def subtitle_directory(directory_name, find=True, create=True) -> Directory:
     """create and returns a directory object of a directory in the subtitles directory"""
-    return Directory(arg=f'{directory_name}\\{config.VID_DIR_NAME}', find=find, create=create)
+    return Directory(arg=os.path.join(directory_name, config.VID_DIR_NAME), find=find, create=create)
 
 
 def search(path: str='.', name=None, extension_type: str='video', raise_error: bool=True) -> File:
@@ -252,12 +528,18 @@ def search(path: str='.', name=None, extension_type: str='video', raise_error: b
     extensions = {'video': config.VID_EXT, 'subtitles': config.SUB_EXT}
 
     if extension_type in extensions:
-        for root, dirnames, filenames in os.walk(path):
-            for extension in extensions[extension_type]:
-                for filename in filenames:
-                    if filename.endswith(extension):
-                        if not name or filename.startswith(name):
-                            return File(path=root, name=filename)
+        index = file_index()
+        if index.covers(path):
+            found = index.find_extension(extensions[extension_type], path=path, name=name)
+            if found:
+                return File(path=found[0], name=found[1])
+        else:
+            for root, dirnames, filenames in os.walk(path):
+                for extension in extensions[extension_type]:
+                    for filename in filenames:
+                        if filename.endswith(extension):
+                            if not name or filename.startswith(name):
+                                return File(path=root, name=filename)
 
     else:
         raise Exception(
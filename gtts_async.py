@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Gtts async file include the concurrent backend of the google translate text to speech
+it speaks the same protocol as gTTS with a bounded number of requests in flight over one pool of connections
+"""
+import re
+import json
+import time
+import base64
+import asyncio
+import urllib.parse
+import config
+
+RPC = 'jQ1olc'
+MAX_CHARS = 100
+HEADERS = {
+    'Referer': 'http://translate.google.com/',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/47.0.2526.106 Safari/537.36',
+    'Content-Type': 'application/x-www-form-urlencoded;charset=utf-8',
+}
+
+
+class RateLimiter:
+    """limit the number of requests per second sent to each host"""
+
+    def __init__(self, rate: float):
+        """
+        :param float rate:
+            requests per second per host, 0 for no limit
+        """
+        self.rate = rate
+        self.next = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, host: str):
+        """wait until a request can be sent to the host"""
+        if not self.rate:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next.get(host, now))
+            self.next[host] = start + 1 / self.rate
+        await asyncio.sleep(start - now)
+
+
+def tokenize(text: str) -> list:
+    """
+    split the text in parts short enough for one request, at punctuation then at spaces
+    :param str text:
+        text of the sequence
+    :return list:
+        parts of the text
+    """
+    pieces = []
+    for piece in re.split(r'(?<=[.!?;:,])\s+', text.strip()):
+        while len(piece) > MAX_CHARS:
+            cut = piece.rfind(' ', 0, MAX_CHARS)
+            cut = cut if cut > 0 else MAX_CHARS
+            pieces.append(piece[:cut])
+            piece = piece[cut:].strip()
+        if piece:
+            pieces.append(piece)
+
+    # join the pieces back as long as they fit in one request
+    parts = []
+    for piece in pieces:
+        if parts and len(parts[-1]) + 1 + len(piece) <= MAX_CHARS:
+            parts[-1] += ' ' + piece
+        else:
+            parts.append(piece)
+    return parts
+
+
+def package(text: str, lang: str, slow: bool=False) -> str:
+    """
+    build the body of the request of a part of text
+    :param str text:
+        part of text
+    :param str lang:
+        language of the speech
+    :param bool slow:
+        slow speech
+    """
+    parameter = json.dumps([text, lang, True if slow else None, 'null'], separators=(',', ':'))
+    rpc = json.dumps([[[RPC, parameter, None, 'generic']]], separators=(',', ':'))
+    return f'f.req={urllib.parse.quote(rpc)}&'
+
+
+def decode(response: str) -> bytes:
+    """
+    extract the mp3 audio of a response
+    :param str response:
+        body of the response
+    """
+    audio = b''
+    for line in response.splitlines():
+        if RPC in line:
+            found = re.search(r'jQ1olc","\[\\"(.*)\\"]', line)
+            if found:
+                audio += base64.b64decode(found.group(1).encode('ascii'))
+    if not audio:
+        raise ValueError('no audio in the response')
+    return audio
+
+
+async def request(session, limiter: RateLimiter, url: str, body: str, retries: int, backoff: float) -> bytes:
+    """
+    send one request, retrying with an exponential backoff
+    :return bytes:
+        mp3 audio
+    """
+    import aiohttp
+
+    host = urllib.parse.urlsplit(url).netloc
+    for attempt in range(retries + 1):
+        await limiter.wait(host)
+        try:
+            async with session.post(url, data=body, headers=HEADERS) as response:
+                if response.status == 429 or response.status >= 500:
+                    raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                      status=response.status, message=response.reason)
+                response.raise_for_status()
+                return decode(await response.text())
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+
+async def speech(jobs: list, lang: str, concurrency: int=8, rate: float=0, retries: int=3, backoff: float=0.5,
+                 url: str=config.GTTS_URL, slow: bool=False) -> dict:
+    """
+    record the sequences concurrently
+    :param list jobs:
+        list of (n, text, file) of the sequences to record
+    :param str lang:
+        language of the speech
+    :param int concurrency:
+        maximum number of requests in flight
+    :param float rate:
+        maximum number of requests per second per host, 0 for no limit
+    :param int retries:
+        number of retries of a failed request
+    :param float backoff:
+        delay before the first retry in seconds, doubled after each retry
+    :param str url:
+        endpoint of the requests
+    :param bool slow:
+        slow speech
+    :return dict:
+        error message of each failed sequence by number
+    """
+    import aiohttp
+
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = {}
+
+    async def record(session, n, text, file):
+        try:
+            audio = b''
+            for part in tokenize(text):
+                async with semaphore:
+                    audio += await request(session, limiter, url, package(part, lang, slow), retries, backoff)
+            with open(file, 'wb') as f:
+                f.write(audio)
+        except Exception as e:
+            errors[n] = f'{type(e).__name__}: {e}'
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*[record(session, n, text, file) for n, text, file in jobs])
+
+    return errors
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Instrument file include Instrument class, which records the wall and cpu time of the stages of a run and its counters
+the report is written to a json file or handed to a callback, each stage can be profiled with cProfile
+"""
+import os
+import re
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+
+class Instrument:
+    """wall time, cpu time and counters of the stages of a run"""
+
+    def __init__(self, report: str='', callback=None, profile: str=''):
+        """
+        Construct a :class:`Instrument <Instrument>`.
+        :param str report:
+            json file of the report, not written if empty
+        :param callback:
+            function called with the report as a dict
+        :param str profile:
+            directory of the cProfile dump of each stage, no profiling if empty
+        """
+        self.report_file = report
+        self.callback = callback
+        self.profile = profile
+        self.stages = []
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.profiling = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        record the time of a stage, a stage started inside another one is named after it ("speech/pass-1")
+        the cpu time is the one of the whole process, the threads running meanwhile included
+        :param str name:
+            name of the stage
+        """
+        stack = self.local.__dict__.setdefault('stack', [])
+        stack.append(name)
+        path = '/'.join(stack)
+
+        profiler = self.start_profile()
+        start, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+            stack.pop()
+            if profiler:
+                self.stop_profile(profiler, path)
+            with self.lock:
+                self.stages.append({'name': path, 'wall': wall, 'cpu': cpu, 'thread': threading.current_thread().name})
+
+    def start_profile(self):
+        """profile a stage unless another stage is already profiled, its dump includes the nested stages"""
+        if not self.profile:
+            return None
+        with self.lock:
+            if self.profiling:
+                return None
+            self.profiling = True
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is active in this interpreter
+            self.profiling = False
+            return None
+        return profiler
+
+    def stop_profile(self, profiler: cProfile.Profile, name: str):
+        """dump the profile of a stage into the profile directory"""
+        profiler.disable()
+        os.makedirs(self.profile, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '-', name)
+        profiler.dump_stats(os.path.join(self.profile, f'{name}.prof'))
+        self.profiling = False
+
+    def count(self, name: str, value: int=1):
+        """
+        add to a counter
+        :param str name:
+            name of the counter
+        :param int value:
+            value added
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> dict:
+        """
+        :return dict:
+            every stage in the order they finished, the total of the stages of the same name and the counters
+        """
+        with self.lock:
+            stages = list(self.stages)
+            counters = dict(self.counters)
+        totals = {}
+        for stage in stages:
+            total = totals.setdefault(stage['name'], {'wall': 0., 'cpu': 0., 'calls': 0})
+            total['wall'] += stage['wall']
+            total['cpu'] += stage['cpu']
+            total['calls'] += 1
+        return {'time': time.time(), 'stages': stages, 'totals': totals, 'counters': counters}
+
+    def emit(self) -> dict:
+        """
+        write the report and hand it to the callback
+        :return dict:
+            the report
+        """
+        report = self.report()
+        if self.report_file:
+            directory = os.path.dirname(self.report_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp = f'{self.report_file}.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=1)
+            os.replace(temp, self.report_file)
+        if self.callback:
+            self.callback(report)
+        return report
+
+    def __repr__(self):
+        return f'Instrument(stages={len(self.stages)}, counters={self.counters})'
@@ -1,13 +1,55 @@
 """logs"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', ERROR: 'error'}
+# messages written at once, and longest time a message waits in the buffer
+BUFFER_SIZE = 256
+FLUSH_INTERVAL = 1.
 
 
 class Logger(object):
-    """logs"""
+    """logs, written in batches by a background thread"""
+
+    def __init__(self, name: str="name", path: str="logs", extension: str=".txt", level: int=INFO,
+                 json_lines: bool=False, echo: bool=True, buffer: int=BUFFER_SIZE, interval: float=FLUSH_INTERVAL):
+        """
+        Construct a :class:`Logger <Logger>`.
+        :param str name:
+            name of the log file
+        :param str path:
+            directory of the log file
+        :param str extension:
+            extension of the log file
+        :param int level:
+            messages below this level are dropped
+        :param bool json_lines:
+            write one json object per message instead of the message
+        :param bool echo:
+            print the messages
+        :param int buffer:
+            number of messages written at once
+        :param float interval:
+            longest time in seconds a message waits before being written
+        """
+        self.path = path
+        self.name = name
+        self.extension = extension
+        self.level = level
+        self.json_lines = json_lines
+        self.echo = echo
+        self.buffer = buffer
+        self.interval = interval
 
-    def __init__(self):
-        self.path = "logs"
-        self.name = "name"
-        self.extension = ".txt"
+        self.queue = queue.Queue()
+        self.writer = None
+        self.lock = threading.Lock()
 
         if type(self) != Logger:
             self.reset()
@@ -19,30 +61,112 @@ class Logger(object):
 
     def reset(self):
         """resets the log file"""
-        open(self.file, 'w').write('')
+        self.flush()
+        os.makedirs(self.path, exist_ok=True)
+        open(self.file, 'w').close()
 
-    def save_log(self, msg):
-        """add a log to the file"""
-        with open(self.file, 'a') as data:
-            data.write(f'{msg}\n')
+    def start(self):
+        """start the background writer on the first message"""
+        with self.lock:
+            if not self.writer:
+                self.writer = threading.Thread(target=self.run, name=f'logger-{self.name}', daemon=True)
+                self.writer.start()
+                atexit.register(self.close)
 
-    def log(self, msg, save=True):
-        """print the log"""
-        print(msg)
-        self.save_log(msg)
+    def run(self):
+        """write the messages of the queue in batches, when the buffer is full, too old or flushed"""
+        lines, echoes = [], []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0., deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
 
+            if isinstance(item, tuple):
+                line, echo = item
+                if line is not None:
+                    lines.append(line)
+                if echo is not None:
+                    echoes.append(echo)
+                if deadline is None:
+                    deadline = time.monotonic() + self.interval
+                if len(lines) + len(echoes) < self.buffer:
+                    continue
 
-class YoutubeDownloaderLogger(Logger):
-    """specific logs from youtube dl"""
-    def __init__(self):
-        Logger.__init__(self)
-        self.name = "ydl"
+            try:
+                self.write(lines, echoes)
+            except Exception as e:
+                # the batch is dropped but the writer keeps running for the next messages
+                sys.stderr.write(f'Warning logger {self.name} could not write {len(lines)} messages in {self.file} : '
+                                 f'{type(e).__name__}: {e}\n')
+            finally:
+                lines, echoes = [], []
+                deadline = None
+                if isinstance(item, threading.Event):
+                    item.set()
+            if item is False:
+                return
+
+    def write(self, lines: list, echoes: list):
+        """write a batch of messages in the log file and on the terminal"""
+        if lines:
+            with open(self.file, 'a', encoding='utf-8') as data:
+                data.write(''.join(lines))
+        if echoes:
+            sys.stdout.write(''.join(echoes))
+            sys.stdout.flush()
+
+    def flush(self):
+        """wait until the messages already logged are written"""
+        writer = self.writer
+        if writer and writer.is_alive():
+            written = threading.Event()
+            self.queue.put(written)
+            # a writer which stopped meanwhile would never set the event
+            while not written.wait(self.interval):
+                if not writer.is_alive():
+                    return
+
+    def close(self):
+        """write the last messages and stop the background writer"""
+        if self.writer and self.writer.is_alive():
+            self.queue.put(False)
+            self.writer.join()
+        self.writer = None
+
+    def format(self, msg, level: int) -> str:
+        """line of a message in the log file"""
+        if self.json_lines:
+            return json.dumps({'time': time.time(), 'name': self.name, 'level': LEVELS.get(level, level),
+                               'msg': str(msg)}) + '\n'
+        return f'{msg}\n'
+
+    def save_log(self, msg, level: int=INFO):
+        """add a log to the file"""
+        if level >= self.level:
+            self.start()
+            self.queue.put((self.format(msg, level), None))
+
+    def log(self, msg, save=True, level: int=INFO):
+        """print the log"""
+        if level < self.level:
+            return
+        self.start()
+        self.queue.put((self.format(msg, level) if save else None, f'{msg}\n' if self.echo else None))
 
     def debug(self, msg):
-        self.log(msg)
+        self.log(msg, level=DEBUG)
 
     def warning(self, msg):
-        self.log(msg)
+        self.log(msg, level=WARNING)
 
     def error(self, msg):
-        self.log(msg)
+        self.log(msg, level=ERROR)
+
+
+class YoutubeDownloaderLogger(Logger):
+    """specific logs from youtube dl"""
+    def __init__(self, level: int=INFO, json_lines: bool=False):
+        Logger.__init__(self, name="ydl", level=level, json_lines=json_lines)
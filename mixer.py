@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Mixer file include the audio decoding tools and Mixer class,
+which adds the recorded speeches at their offset into one memory mapped track
+"""
+import os
+import wave
+import subprocess
+import numpy as np
+import audio
+from stretch import stretch_batch
+
+RATE = 44100
+CHANNELS = 2
+BLOCK = 1 << 20
+
+
+def ffmpeg_exe() -> str:
+    """return the ffmpeg executable, the one of imageio if available like moviepy"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+
+def decode(file: str, rate: int=RATE, channels: int=CHANNELS) -> np.ndarray:
+    """
+    decode an audio file into float32 pcm
+    pcm wav files at the right rate are read directly, other files are decoded with ffmpeg
+    :param str file:
+        audio file full name
+    :param int rate:
+        sample rate of the output
+    :param int channels:
+        number of channels of the output
+    :return np.ndarray:
+        samples of shape (frames, channels) between -1 and 1
+    """
+    try:
+        with wave.open(file, 'rb') as f:
+            if f.getframerate() == rate and f.getsampwidth() in (1, 2, 4):
+                width = f.getsampwidth()
+                data = np.frombuffer(f.readframes(f.getnframes()), dtype={1: np.uint8, 2: np.int16, 4: np.int32}[width])
+                samples = data.reshape(-1, f.getnchannels()).astype(np.float32)
+                if width == 1:
+                    samples = (samples - 128) / 128
+                else:
+                    samples /= float(1 << (8 * width - 1))
+                return remix(samples, channels)
+    except (wave.Error, EOFError):
+        pass
+
+    command = [ffmpeg_exe(), '-v', 'error', '-i', file, '-f', 'f32le', '-acodec', 'pcm_f32le',
+               '-ac', str(channels), '-ar', str(rate), 'pipe:1']
+    output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+    return np.frombuffer(output, dtype=np.float32).reshape(-1, channels)
+
+
+def pcm(data: np.ndarray, channels: int=CHANNELS) -> np.ndarray:
+    """
+    convert 16 bits samples, such as a view of a PackStore, into float32 pcm
+    :param np.ndarray data:
+        16 bits samples of shape (frames, channels)
+    :param int channels:
+        number of channels of the output
+    """
+    return remix(data.astype(np.float32) / 32768, channels)
+
+
+def remix(samples: np.ndarray, channels: int) -> np.ndarray:
+    """
+    convert samples to a number of channels
+    :param np.ndarray samples:
+        samples of shape (frames, channels)
+    :param int channels:
+        number of channels of the output
+    """
+    if samples.shape[1] == channels:
+        return samples
+    mono = samples.mean(axis=1, keepdims=True)
+    return np.repeat(mono, channels, axis=1)
+
+
+class Mixer:
+    """mix audio clips at their offset into a memory mapped float32 track and write it as a wav file"""
+
+    def __init__(self, file: str, duration: float, rate: int=RATE, channels: int=CHANNELS, start: float=0.):
+        """
+        Construct a :class:`Mixer <Mixer>`.
+        :param str file:
+            wav file of the output, the track is mapped next to it until it is written
+        :param float duration:
+            duration of the track in seconds
+        :param int rate:
+            sample rate of the track
+        :param int channels:
+            number of channels of the track
+        :param float start:
+            time of the first frame of the track in seconds, to mix a window of a longer track
+        """
+        self.file = file
+        self.rate = rate
+        self.channels = channels
+        self.origin = int(round(start * rate))
+        self.frames = max(1, int(round(duration * rate)))
+        self.gain = 1.
+        self.buffer_file = f'{file}.f32'
+        self.track = np.memmap(self.buffer_file, dtype=np.float32, mode='w+', shape=(self.frames, channels))
+
+    def add(self, samples: np.ndarray, start: float):
+        """
+        add samples to the track
+        :param np.ndarray samples:
+            samples of shape (frames, channels) at the rate of the track
+        :param float start:
+            offset of the samples in seconds
+        """
+        offset = int(round(start * self.rate)) - self.origin
+        if offset < 0:
+            samples, offset = samples[-offset:], 0
+        end = min(self.frames, offset + len(samples))
+        if end > offset:
+            self.track[offset:end] += samples[:end - offset]
+
+    def add_file(self, file: str, start: float, duration: float=None):
+        """
+        decode an audio file and add it to the track
+        :param str file:
+            audio file full name
+        :param float start:
+            offset of the clip in seconds
+        :param float duration:
+            stretch the clip to this duration in seconds keeping its tone, None keeps its duration
+        """
+        self.add_files([(file, start, duration)])
+
+    def add_files(self, clips, batch: int=64):
+        """
+        decode audio files and add them to the track, the clips to stretch are stretched by batches
+        :param clips:
+            iterable of (file, start, duration) as in add_file,
+            file can be the 16 bits samples of the speech at the rate of the track instead of its file
+        :param int batch:
+            number of clips stretched together
+        """
+        pending = []
+        for file, start, duration in clips:
+            if isinstance(file, np.ndarray):
+                samples = pcm(file, channels=self.channels)
+            else:
+                samples = decode(file, rate=self.rate, channels=self.channels)
+            if not duration:
+                self.add(samples, start)
+                continue
+            pending.append((samples, start, int(round(duration * self.rate))))
+            if len(pending) >= batch:
+                self.add_stretched(pending)
+                pending = []
+        if pending:
+            self.add_stretched(pending)
+
+    def add_stretched(self, pending: list):
+        """
+        stretch clips together and add them to the track
+        :param list pending:
+            list of (samples, start, frames)
+        """
+        stretched = stretch_batch([samples for samples, _, _ in pending], [frames for _, _, frames in pending])
+        for samples, (_, start, _) in zip(stretched, pending):
+            self.add(samples, start)
+
+    def peak(self) -> float:
+        """get the highest absolute sample of the track"""
+        peak = 0.
+        for i in range(0, self.frames, BLOCK):
+            peak = max(peak, float(np.abs(self.track[i:i + BLOCK]).max()))
+        return peak
+
+    def write(self, limit: bool=True):
+        """
+        write the track into a 16 bits wav file block by block and remove the memory mapped track
+        :param bool limit:
+            scale the whole track down if it saturates, otherwise the saturated samples are clipped
+        """
+        gain = 1.
+        if limit:
+            peak = self.peak()
+            gain = 1 / peak if peak > 1 else 1.
+        self.gain = gain
+
+        with wave.open(self.file, 'wb') as f:
+            f.setnchannels(self.channels)
+            f.setsampwidth(2)
+            f.setframerate(self.rate)
+            for i in range(0, self.frames, BLOCK):
+                block = np.clip(self.track[i:i + BLOCK] * gain, -1, 1)
+                f.writeframes((block * 32767).astype('<i2').tobytes())
+
+        self.close()
+
+    def close(self):
+        """release and remove the memory mapped track"""
+        # dropping the last reference unmaps the file
+        self.track = None
+        if os.path.exists(self.buffer_file):
+            os.remove(self.buffer_file)
+
+    def __repr__(self):
+        return f'Mixer(file={self.file}, frames={self.frames}, rate={self.rate}, channels={self.channels})'
+
+
+def patch(file: str, windows: list, clips: list) -> bool:
+    """
+    mix again some windows of a track written by Mixer.write without scaling it down, the rest of the track is kept
+    each window is cleared then every clip overlapping it is added again, only its part inside the window
+    a track scaled down would need the gain of its new peak, which the windows alone do not give
+    :param str file:
+        16 bits wav file of the track
+    :param list windows:
+        (start, end) in seconds of each window
+    :param list clips:
+        (file, start, duration, length) of every clip of the track, as in Mixer.add_files with length the duration
+        of the clip in the track in seconds
+    :return bool:
+        the windows were mixed, False if a window saturates and the whole track must be mixed again
+    """
+    with open(file, 'rb') as f:
+        duration, rate, channels = audio.wav_info(f)
+        offset = f.tell()
+    frames = int(round(duration * rate))
+    track = np.memmap(file, dtype='<i2', mode='r+', offset=offset, shape=(frames, channels))
+    try:
+        for start, end in windows:
+            first, last = max(0, int(round(start * rate))), min(frames, int(round(end * rate)))
+            if last <= first:
+                continue
+            mixer = Mixer(f'{file}.patch', duration=(last - first) / rate, rate=rate, channels=channels,
+                          start=first / rate)
+            try:
+                mixer.add_files((clip, at, stretch) for clip, at, stretch, length in clips
+                                if at < last / rate and at + length > first / rate)
+                block = mixer.track[:last - first]
+                if np.abs(block).max(initial=0) > 1:
+                    return False
+                track[first:last] = (block * 32767).astype('<i2')
+            finally:
+                mixer.close()
+        track.flush()
+    finally:
+        del track
+    return True
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Planner file include the planning of the utterances spoken instead of the sequences of a subtitles file
+the short sequences (as the ones of the automatic captions) are merged into sentences and the long ones are split
+at their punctuation
+"""
+import re
+from cues import Cues
+
+# longest silence in seconds between two sequences of an utterance
+MAX_GAP = 0.5
+# longest utterance in seconds and in characters
+MAX_DURATION = 12.
+MAX_CHARS = 220
+
+SENTENCE_END = re.compile(r'[.!?…。！？]["\')\]»]*$')
+CLAUSE_END = re.compile(r'(?<=[.!?…;:,。！？、])\s+')
+
+
+def plan(cues: Cues, max_gap: float=MAX_GAP, max_duration: float=MAX_DURATION, max_chars: int=MAX_CHARS):
+    """
+    plan the utterances of a table of sequences
+    :param Cues cues:
+        table of the sequences
+    :param float max_gap:
+        longest silence in seconds between two merged sequences
+    :param float max_duration:
+        longest utterance in seconds
+    :param int max_chars:
+        longest utterance in characters
+    :return Cues:
+        table of the utterances
+    """
+    starts, ends, texts = [], [], []
+    for first, last in merge(cues, max_gap=max_gap, max_duration=max_duration, max_chars=max_chars):
+        text = ' '.join(cues.text[first:last + 1])
+        start, end = float(cues.start[first]), float(cues.end[first:last + 1].max())
+        for piece in split(start, end, text, max_duration=max_duration, max_chars=max_chars):
+            starts.append(piece[0])
+            ends.append(piece[1])
+            texts.append(piece[2])
+    return Cues(starts, ends, texts)
+
+
+def merge(cues: Cues, max_gap: float=MAX_GAP, max_duration: float=MAX_DURATION, max_chars: int=MAX_CHARS) -> list:
+    """
+    group the consecutive sequences which are parts of the same sentence
+    a sequence ending a sentence, a silence longer than max_gap or the limits of an utterance end a group,
+    the sequences starting with "#" are never merged
+    :return list:
+        (first, last) sequence of each group
+    """
+    groups = []
+    first, end, chars = None, 0., 0
+    for n, (start, stop, text) in enumerate(zip(cues.start.tolist(), cues.end.tolist(), cues.text)):
+        if first is not None and not (
+                text.startswith('#') or cues.text[first].startswith('#')
+                or SENTENCE_END.search(cues.text[n - 1])
+                or start - end > max_gap
+                or max(stop, end) - cues.start[first] > max_duration
+                or chars + 1 + len(text) > max_chars):
+            end, chars = max(stop, end), chars + 1 + len(text)
+            continue
+        if first is not None:
+            groups.append((first, n - 1))
+        first, end, chars = n, stop, len(text)
+    if first is not None:
+        groups.append((first, len(cues) - 1))
+    return groups
+
+
+def split(start: float, end: float, text: str, max_duration: float=MAX_DURATION, max_chars: int=MAX_CHARS) -> list:
+    """
+    split a long utterance at its punctuation, the time of each piece is in proportion to its characters
+    an utterance without punctuation is kept as it is
+    :return list:
+        (start, end, text) of each piece
+    """
+    duration = end - start
+    if duration <= max_duration and len(text) <= max_chars:
+        return [(start, end, text)]
+
+    # most characters of a piece so it is within both limits
+    limit = min(max_chars, int(len(text) * max_duration / duration) if duration > 0 else max_chars)
+    pieces, piece = [], ''
+    for clause in CLAUSE_END.split(text):
+        if piece and len(piece) + 1 + len(clause) > limit:
+            pieces.append(piece)
+            piece = clause
+        else:
+            piece = f'{piece} {clause}' if piece else clause
+    pieces.append(piece)
+
+    results, position = [], 0
+    total = sum(len(p) for p in pieces)
+    for piece in pieces:
+        results.append((start + duration * position / total, start + duration * (position + len(piece)) / total,
+                        piece))
+        position += len(piece)
+    return results
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Render file include RenderState class, the sidecar record of the last render of a directory
+it keeps the key of the speech of each sequence and the clips of the mixed track,
+so a render after a few fixes of the subtitles only records the changed sequences and mixes the changed windows
+"""
+import os
+import json
+import hashlib
+
+
+def speech_key(engine: str, voice, language: str, text: str) -> str:
+    """
+    get the key of a speech, two sequences with the same key are spoken the same way at the same rate
+    :param str engine:
+        "pyttsx3" or "gtts"
+    :param voice:
+        id of the voice
+    :param str language:
+        language of the speech
+    :param str text:
+        text of the sequence
+    """
+    return hashlib.sha1(json.dumps([engine, voice, language, text]).encode('utf-8')).hexdigest()[:20]
+
+
+def clip_key(speech: str, rate: float, start: float, duration) -> str:
+    """
+    get the key of a clip of the mixed track, the same speech at the same place stretched the same way
+    :param str speech:
+        key of the speech
+    :param float rate:
+        rate of the speech, None for the engines without rate
+    :param float start:
+        offset of the clip in seconds
+    :param duration:
+        duration the clip is stretched to in seconds, None if it is not stretched
+    """
+    rate = None if rate is None or rate != rate else round(rate, 3)
+    duration = None if duration is None else round(duration, 3)
+    return f'{speech}:{rate}:{start:.3f}:{duration}'
+
+
+class RenderState:
+    """record of the last render of a directory, next to its speeches"""
+
+    name = '.render-state.json'
+
+    def __init__(self, directory: str):
+        """
+        Construct a :class:`RenderState <RenderState>`.
+        :param str directory:
+            directory of the speeches
+        """
+        self.directory = str(directory)
+        self.file = os.path.join(self.directory, self.name)
+        # key, rate and recorded duration of the speech of each sequence
+        self.speeches = []
+        # file, rate, channels, frames, gain, correct_speed and [key, start, length] of each clip of the track
+        self.track = {}
+        self.load()
+
+    def load(self):
+        """load the record of the directory"""
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.speeches = state.get('speeches', [])
+            self.track = state.get('track', {})
+        except (FileNotFoundError, ValueError):
+            self.speeches, self.track = [], {}
+
+    def save(self):
+        """save the record of the directory"""
+        temp = f'{self.file}.{os.getpid()}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'speeches': self.speeches, 'track': self.track}, f)
+        os.replace(temp, self.file)
+
+    def __repr__(self):
+        return f'RenderState(directory={self.directory}, speeches={len(self.speeches)}, ' \
+               f'clips={len(self.track.get("clips", []))})'
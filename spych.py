@@ -2,7 +2,14 @@
 """
 This module implements the core developer interface for Spych.
 """
+import os
+import subprocess
+import config
+from concurrent.futures import ThreadPoolExecutor
+from cache import AudioCache
 from download import Download
+from instrument import Instrument
+from store import PackStore
 from files import Directory, File, create_video_directory, video_directory, search
 from subtitles import Subtitles
 from video import Video
@@ -15,7 +22,7 @@ class Spych:
                  download: Download=None, directory: Directory=None, video: Video=None, subtitles: Subtitles=None,
                  directory_name: str='', video_name: str='', subtitles_name: str ='',
                  language: str='en', video_language: str='en', res: int=0, output_name: str ='Output-{name}{ext}',
-                 autoprocess: bool=True):
+                 autoprocess: bool=True, pipeline: bool=False, instrument: Instrument=None):
         """
         Construct a :class:`Spych <Spych>`.
 
@@ -49,6 +56,10 @@ class Spych:
             the name of the output file
         :param autoprocess:
             automatically process the speech and editing when call
+        :param bool pipeline:
+            download the video in the background, the speech starts as soon as the subtitles are downloaded
+        :param Instrument instrument:
+            records the time of each stage and the counters of the run, its report is emitted after the editing
         """
 
         self.directory = None
@@ -56,6 +67,8 @@ class Spych:
         self.subtitles = None
         self.lang = language
         self.output_name = output_name
+        self.pending_video = None
+        self.instrument = instrument or Instrument()
 
         create_video_directory()
 
@@ -66,11 +79,12 @@ class Spych:
                 download = self.create_download(
                     query=query, video_language=video_language,
                     directory=self.directory, video_name=video_name, subtitles_name=subtitles_name)
-            self.download(download, res=res)
+            self.download(download, res=res, pipeline=pipeline)
         else:
             self.find(video=video, video_name=video_name, subtitles=subtitles, subtitles_name=subtitles_name)
 
-        self.update_output_name()
+        if not self.pending_video:
+            self.update_output_name()
 
         if autoprocess:
             self.process()
@@ -162,17 +176,69 @@ class Spych:
         return Download(query, langs=(self.lang, video_language), directory=directory,
                         video_name=video_name, subtitles_name=subtitles_name)
 
-    def download(self, download: Download, res: int):
+    def download(self, download: Download, res: int, pipeline: bool=False):
         """
         download video and subtitles if possible from youtube using the download object
         :param Download download:
             Download object of a search
         :param int res:
             resolution of the video 0 the worst, -1 the best
+        :param bool pipeline:
+            only wait for the subtitles, the video is downloaded in the background until wait_video
         """
-        download.dl(res=res)
+        if not pipeline:
+            with self.instrument.stage('download'):
+                download.dl(res=res)
+            self.instrument.count('bytes_downloaded', download.downloaded)
+            self.directory = download.directory
+            self.find_video(video_name=download.video_file.name)
+            self.load_subtitles(download)
+            return
+
+        with self.instrument.stage('download'):
+            download.subtitle()
         self.directory = download.directory
-        self.find(video_name=download.video_file.name, subtitles_name=download.subtitles_file.name)
+        self.load_subtitles(download)
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_video = (executor.submit(self.download_video, download, res), download)
+        executor.shutdown(wait=False)
+
+    def download_video(self, download: Download, res: int):
+        """
+        download the video, in the background when the download is pipelined
+        :param Download download:
+            Download object whose subtitles are downloaded
+        :param int res:
+            resolution of the video 0 the worst, -1 the best
+        """
+        with self.instrument.stage('download/video'):
+            download.video(only_video=download.subtitle_downloaded, res=res)
+
+    def load_subtitles(self, download: Download):
+        """
+        create the subtitles from the sequences parsed by the download, or from its file if they were not parsed
+        :param Download download:
+            Download object whose subtitles are downloaded
+        """
+        if download.cues is not None:
+            self.subtitles = Subtitles(download.subtitles_file, cues=download.cues)
+        elif download.subtitles_file:
+            self.find_subtitles(subtitles_name=download.subtitles_file.name)
+
+    def wait_video(self):
+        """wait for the video downloaded in the background, then find it"""
+        if not self.pending_video:
+            return
+        future, download = self.pending_video
+        if not future.done():
+            print(f'Waiting for the download of the video {download.name}')
+        with self.instrument.stage('wait'):
+            future.result()
+        self.instrument.count('bytes_downloaded', download.downloaded)
+        self.pending_video = None
+        self.find_video(video_name=download.video_file.name)
+        self.update_output_name()
 
     def find(self, video: Video=None, video_name: str=None, subtitles: Subtitles=None, subtitles_name: str=None):
         """
@@ -197,58 +263,242 @@ class Spych:
         for key in output_vars:
             self.output_name = self.output_name.replace(key, output_vars[key])
 
-    def speech(self, mode: str='pyttsx3', depth: int=2):
+    def speech(self, mode: str='pyttsx3', depth: int=2, workers: int=1, tolerance: float=0.05, predict: bool=False,
+               cache: AudioCache=None, plan: bool=False, incremental: bool=False, packed: bool=False,
+               concurrency: int=8, url: str=config.GTTS_URL, request_rate: float=0, retries: int=3):
         """
         create the speeches using subtitles.speech()
         :param str mode:
-            "pyttsx3" or "gtts"
+            "pyttsx3", "daemon" (the engines of the speech daemon, see daemon.py), "gtts" or "gtts_async"
         :param int depth:
             the number of recursions
+        :param int workers:
+            number of worker processes used by pyttsx3
+        :param float tolerance:
+            accepted gap between the recorded speech and the sequence duration, as a ratio
+        :param bool predict:
+            seed the pyttsx3 rate from the words per second of each sequence
+        :param AudioCache cache:
+            cache of the recorded speeches, None keeps the cache of the subtitles
+        :param bool plan:
+            speak sentences merged from the short sequences and split from the long ones instead of the sequences
+        :param bool incremental:
+            keep the speeches of the previous render whose text did not change, only record the others
+        :param bool packed:
+            keep the speeches in one packed pcm file of the subtitles directory instead of one file per sequence
+        :param int concurrency:
+            maximum number of requests in flight used by gtts_async
+        :param str url:
+            endpoint of the requests of gtts_async, can be a local server
+        :param float request_rate:
+            maximum number of requests per second per host used by gtts_async, 0 for no limit
+        :param int retries:
+            number of retries of a failed request of gtts_async
         """
-        self.subtitles.speech(mode=mode, depth=depth)
+        if plan:
+            self.subtitles.plan()
+        if cache is not None:
+            self.subtitles.cache = cache
+        if packed and self.subtitles.store is None:
+            self.subtitles.store = PackStore(str(self.subtitles.directory))
+        self.subtitles.instrument = self.instrument
+        self.subtitles.speech(mode=mode, depth=depth, workers=workers, tolerance=tolerance, predict=predict,
+                              incremental=incremental, concurrency=concurrency, url=url, request_rate=request_rate,
+                              retries=retries)
         print(f'Successfully recorded the voice using {mode}')
 
-    def edit(self, correct_speed: bool=False):
+    def edit(self, correct_speed: bool=False, mode: str='auto', incremental: bool=False, workers: int=0):
         """
         do the video montage of all audio clips at the right spots and export it to the folder in the self.output_name
         :param correct_speed:
-            speed up or slow down the clips if they are not at the right speed
-            warning : causes ton change
+            speed up or slow down the clips if they are not at the right speed, their tone is kept
+        :param str mode:
+            "remux" copies the video stream and only encodes the new audio track,
+            "segments" encodes the video again in segments encoded at once then joined,
+            "encode" encodes the whole video again with moviepy,
+            "auto" remuxes unless the container or the codec of the output forces an encoding, then uses segments
+        :param bool incremental:
+            only mix again the windows of the track of the previous render whose speeches changed, then remux
+        :param int workers:
+            number of segments encoded at once, 0 for the number of cores
         """
-        import moviepy.editor as mpy
+        if mode not in ('auto', 'remux', 'segments', 'encode'):
+            raise Exception(f'unknown mode : {mode}')
+
+        with self.instrument.stage('edit'):
+            output = self.compose(correct_speed=correct_speed, mode=mode, incremental=incremental, workers=workers)
+        self.instrument.count('bytes_written', os.path.getsize(output))
+        self.instrument.emit()
+
+    def compose(self, correct_speed: bool=False, mode: str='auto', incremental: bool=False, workers: int=0) -> str:
+        """
+        mix the speeches and write them with the video, as in edit
+        :param correct_speed:
+            speed up or slow down the clips if they are not at the right speed, their tone is kept
+        :param str mode:
+            "auto", "remux", "segments" or "encode"
+        :param bool incremental:
+            only mix again the changed windows of the track of the previous render
+        :param int workers:
+            number of segments encoded at once, 0 for the number of cores
+        :return str:
+            file of the output
+        """
+        self.wait_video()
 
         print('Preprocessing the speeches of the video')
 
         if not self.subtitles:
             print("Warning speeches files not generated yet")
 
-        video = mpy.VideoFileClip(str(self.video.file))
-
-        audios = []
-        for sequence in self.subtitles:
-            try:
-                if sequence.recorded > 0 and not sequence.text.startswith('#'):
-                    subtitle_audio = mpy.AudioFileClip(self.subtitles.get_file(sequence.Index))
-                else:
-                    continue
-            except OSError:
-                raise FileNotFoundError("audio files missing, did you started the subtitle.speech method ?")
+        output = os.path.join(str(self.directory), self.output_name)
+        extension = os.path.splitext(self.output_name)[1]
+        if mode == 'auto':
+            mode = 'remux' if self.video.can_remux(extension) else 'segments'
 
-            if correct_speed:
-                subtitle_audio = subtitle_audio.fx(mpy.vfx.speedx, subtitle_audio.duration/sequence.duration)
+        print("Composing the speeches together")
 
-            audios.append(subtitle_audio.set_start(sequence.time[0]))
+        with self.instrument.stage('mix'):
+            audio_file = self.mix(duration=self.video.duration, correct_speed=correct_speed, incremental=incremental)
+        self.instrument.count('bytes_written', os.path.getsize(audio_file))
 
-        print("Composing the speeches together")
+        if mode == 'remux':
+            print(f'Remuxing the video {self.video.file.name} with the voices')
+            try:
+                with self.instrument.stage('remux'):
+                    self.video.remux(audio_file, output, extension)
+                return output
+            except subprocess.CalledProcessError as e:
+                print(f'Warning remuxing failed ({e.stderr.decode("utf-8", "replace").strip()}), encoding instead')
+                mode = 'segments'
+
+        if mode == 'segments':
+            print(f'Encoding the video {self.video.file.name} with the voices in segments')
+            try:
+                with self.instrument.stage('segments'):
+                    self.video.render_segments(audio_file, output, extension, workers=workers)
+                return output
+            except subprocess.CalledProcessError as e:
+                print(f'Warning encoding in segments failed ({e.stderr.decode("utf-8", "replace").strip()}), '
+                      f'encoding with moviepy instead')
+
+        with self.instrument.stage('encode'):
+            self.encode(audio_file, output)
+        return output
+
+    def encode(self, audio_file: str, output: str):
+        """
+        encode the whole video again with a new audio track
+        :param str audio_file:
+            file of the new audio track
+        :param str output:
+            file of the output
+        """
+        import moviepy.editor as mpy
 
-        main_audio = mpy.CompositeAudioClip(audios)
+        video = mpy.VideoFileClip(str(self.video.file))
 
         print(f'Editing the video {self.video.file.name} to match the video with voices')
 
-        video.audio = main_audio
+        video.audio = mpy.AudioFileClip(audio_file)
 
         print(f'Saving the video {self.video.file.name}')
-        video.write_videofile(f"{self.directory}\\{self.output_name}")
+        video.write_videofile(output)
+
+    def mix(self, duration: float, correct_speed: bool=False, incremental: bool=False) -> str:
+        """
+        mix the speeches at their start into one wav track, decoding one speech at a time
+        the clips of the track are recorded for the next incremental mix
+        :param float duration:
+            duration of the track in seconds
+        :param correct_speed:
+            stretch the clips to the duration of their sequence keeping their tone
+        :param bool incremental:
+            only mix again the windows of the track of the previous render whose clips changed
+        :return str:
+            wav file of the track
+        """
+        from mixer import Mixer, RATE, CHANNELS
+        from render import RenderState, clip_key
+
+        file = os.path.join(str(self.directory), f"{self.output_name}.wav")
+        placed = [sequence for sequence in self.subtitles
+                  if not (sequence.Index in self.subtitles.failed or sequence.recorded <= 0
+                          or sequence.text.startswith('#'))]
+        try:
+            # (file or samples, start, stretched duration, length in the track) of each clip
+            clips = [(self.subtitles.get_source(sequence.Index), sequence.start,
+                      sequence.duration if correct_speed else None,
+                      sequence.duration if correct_speed else self.subtitles.get_record(sequence.Index))
+                     for sequence in placed]
+        except (OSError, ValueError):
+            raise FileNotFoundError("audio files missing, did you started the subtitle.speech method ?")
+
+        state = RenderState(str(self.subtitles.directory))
+        speeches = state.speeches if len(state.speeches) == len(self.subtitles) else None
+        keys = [clip_key(speeches[sequence.Index]['key'], speeches[sequence.Index]['rate'], start, stretch)
+                if speeches and speeches[sequence.Index]['key'] else None
+                for sequence, (_, start, stretch, _) in zip(placed, clips)]
+        track = {'file': file, 'frames': max(1, int(round(duration * RATE))), 'rate': RATE, 'channels': CHANNELS,
+                 'correct_speed': correct_speed}
+
+        if incremental and self.patch(state.track, track, keys, clips):
+            track['gain'] = 1.
+        else:
+            mixer = Mixer(file, duration=duration)
+            try:
+                try:
+                    mixer.add_files(clip[:3] for clip in clips)
+                except (OSError, subprocess.CalledProcessError):
+                    raise FileNotFoundError("audio files missing, did you started the subtitle.speech method ?")
+                mixer.write()
+            finally:
+                mixer.close()
+            track['gain'] = mixer.gain
+
+        track['clips'] = [[key, start, length] for key, (_, start, _, length) in zip(keys, clips)]
+        state.track = track
+        state.save()
+        return file
+
+    def patch(self, previous: dict, track: dict, keys: list, clips: list) -> bool:
+        """
+        mix again the windows of the track of the previous render where clips were added, removed or changed
+        :param dict previous:
+            track of the previous render
+        :param dict track:
+            file, frames, rate, channels and correct_speed of the track to mix
+        :param list keys:
+            key of each clip
+        :param list clips:
+            (file, start, stretched duration, length in the track) of each clip
+        :return bool:
+            the track is up to date, False if it must be mixed entirely
+        """
+        from mixer import patch
+
+        # a track scaled down to fit its peak is mixed entirely, the edit may change its peak and so its gain
+        if not previous or previous.get('gain') != 1 or not os.path.isfile(track['file']) or None in keys \
+                or any(previous.get(name) != value for name, value in track.items()) \
+                or any(key is None for key, _, _ in previous['clips']):
+            return False
+
+        old = {key: (start, length) for key, start, length in previous['clips']}
+        new = {key: (start, length) for key, (_, start, _, length) in zip(keys, clips)}
+        changed = sorted([old[key] for key in old.keys() - new.keys()] + [new[key] for key in new.keys() - old.keys()])
+
+        windows = []
+        for start, length in changed:
+            if windows and start <= windows[-1][1]:
+                windows[-1][1] = max(windows[-1][1], start + length)
+            else:
+                windows.append([start, start + length])
+        total = sum(end - start for start, end in windows)
+        if total > track['frames'] / track['rate'] / 2:
+            return False
+        if windows:
+            print(f'Mixing again {len(windows)} windows ({total:.1f}s) of the track')
+        return patch(track['file'], windows, clips)
 
     def process(self):
         """
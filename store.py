@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Store file include PackStore class, the packed store of the recorded speeches of a directory
+the speeches are decoded once into a single append-only 16 bits pcm blob, with an index of the offset,
+the number of frames and the channels of each sequence, instead of one audio file per sequence
+"""
+import os
+import json
+import numpy as np
+import audio
+from mixer import RATE, decode
+
+
+class PackStore:
+    """
+    single append-only pcm blob of the speeches of a directory and its index
+    a sequence recorded again is appended, the space of its previous speech is reclaimed by compact
+    """
+
+    name = '.speeches'
+
+    def __init__(self, directory: str, rate: int=RATE):
+        """
+        Construct a :class:`PackStore <PackStore>`.
+        :param str directory:
+            directory of the speeches
+        :param int rate:
+            sample rate of the speeches in the blob, the one of the mixed track so they are mixed as they are
+        """
+        self.directory = str(directory)
+        self.blob = os.path.join(self.directory, f'{self.name}.pcm')
+        self.file = os.path.join(self.directory, f'{self.name}.json')
+        self.rate = rate
+        # number of the sequence -> [offset in bytes, frames, channels]
+        self.entries = {}
+        self.size = 0
+        self.changed = False
+        self.map = None
+        self.load()
+
+    def load(self):
+        """load the index, the blob is dropped if its index is missing or was written at another rate"""
+        try:
+            with open(self.file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index['rate'] != self.rate or index['size'] > os.path.getsize(self.blob):
+                raise ValueError('index of another blob')
+            self.entries = {int(n): entry for n, entry in index['entries'].items()}
+            self.size = index['size']
+        except (FileNotFoundError, ValueError, KeyError):
+            self.entries, self.size = {}, 0
+        # the bytes appended after the last save of the index are not indexed
+        if os.path.exists(self.blob) and os.path.getsize(self.blob) != self.size:
+            with open(self.blob, 'r+b') as f:
+                f.truncate(self.size)
+
+    def save(self):
+        """save the index if it changed"""
+        if not self.changed:
+            return
+        temp = f'{self.file}.{os.getpid()}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump({'rate': self.rate, 'size': self.size, 'entries': self.entries}, f)
+        os.replace(temp, self.file)
+        self.changed = False
+
+    def put(self, n: int, file: str, remove: bool=True):
+        """
+        decode a recorded speech and append it to the blob
+        :param int n:
+            number of the sequence
+        :param str file:
+            audio file of the speech
+        :param bool remove:
+            remove the file once it is packed
+        """
+        channels = audio.info(file)['channels']
+        samples = decode(file, rate=self.rate, channels=channels)
+        # the scale of mixer.decode and mixer.pcm, 16 bits speeches are stored as they are
+        data = np.clip(np.round(samples * 32768), -32768, 32767).astype('<i2')
+        self.append(n, data)
+        if remove:
+            os.remove(file)
+
+    def append(self, n: int, data: np.ndarray):
+        """
+        append the samples of a sequence to the blob
+        :param int n:
+            number of the sequence
+        :param np.ndarray data:
+            16 bits samples of shape (frames, channels) at the rate of the store
+        """
+        with open(self.blob, 'ab') as f:
+            f.write(data.tobytes())
+        self.entries[n] = [self.size, len(data), data.shape[1]]
+        self.size += data.nbytes
+        self.changed = True
+
+    def read(self, n: int) -> np.ndarray:
+        """
+        get the speech of a sequence, a view of the memory mapped blob without copy
+        :param int n:
+            number of the sequence
+        :return np.ndarray:
+            16 bits samples of shape (frames, channels) at the rate of the store
+        """
+        if n not in self.entries:
+            raise FileNotFoundError(f'no speech of the sequence {n} in {self.blob}')
+        offset, frames, channels = self.entries[n]
+        if not frames:
+            return np.zeros((0, channels), dtype='<i2')
+        if self.map is None or len(self.map) < self.size:
+            # mapped again once the blob grew
+            self.map = np.memmap(self.blob, dtype='<i2', mode='r', shape=(self.size // 2,))
+        return self.map[offset // 2:offset // 2 + frames * channels].reshape(frames, channels)
+
+    def duration(self, n: int) -> float:
+        """
+        get the duration of the speech of a sequence from the index
+        :param int n:
+            number of the sequence
+        """
+        if n not in self.entries:
+            raise FileNotFoundError(f'no speech of the sequence {n} in {self.blob}')
+        return self.entries[n][1] / self.rate
+
+    def discard(self, n: int):
+        """
+        forget the speech of a sequence, its space is reclaimed by compact
+        :param int n:
+            number of the sequence
+        """
+        if self.entries.pop(n, None):
+            self.changed = True
+
+    def renumber(self, moves: list):
+        """
+        give the speeches of some sequences to others, as if their files were renamed
+        :param list moves:
+            (previous number, new number) of each speech moved
+        """
+        moved = {m: self.entries.pop(m) for m, n in moves}
+        for m, n in moves:
+            self.entries[n] = moved[m]
+        self.changed = self.changed or bool(moves)
+
+    def compact(self):
+        """write the blob again without the speeches recorded again or discarded, if they are most of it"""
+        live = sum(frames * channels * 2 for _, frames, channels in self.entries.values())
+        if self.size - live <= live:
+            return
+        self.map = None
+        temp = f'{self.blob}.{os.getpid()}.tmp'
+        entries, size = {}, 0
+        with open(self.blob, 'rb') as source, open(temp, 'wb') as f:
+            for n, (offset, frames, channels) in sorted(self.entries.items(), key=lambda e: e[1][0]):
+                source.seek(offset)
+                f.write(source.read(frames * channels * 2))
+                entries[n] = [size, frames, channels]
+                size += frames * channels * 2
+        os.replace(temp, self.blob)
+        self.entries, self.size, self.changed = entries, size, True
+        self.save()
+
+    def __contains__(self, n: int):
+        return n in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __repr__(self):
+        return f'PackStore(directory={self.directory}, entries={len(self)}, size={self.size})'
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Stretch file include a phase vocoder which changes the duration of clips without changing their tone
+many clips are stretched together in one batch of fft, without any python loop over the frames
+"""
+import numpy as np
+
+N_FFT = 1024
+HOP = N_FFT // 4
+# frames of a batch, bounds the memory of the spectrums
+BATCH_FRAMES = 4096
+
+# periodic hann window, the sum of its squares over the overlapping frames is 1.5
+WINDOW = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+TWO_PI = np.float32(2 * np.pi)
+OMEGA = (2 * np.pi * HOP * np.arange(N_FFT // 2 + 1) / N_FFT).astype(np.float32)
+
+
+def stretch(samples: np.ndarray, frames: int) -> np.ndarray:
+    """
+    stretch a clip to a number of frames keeping its tone
+    :param np.ndarray samples:
+        samples of shape (frames, channels)
+    :param int frames:
+        number of frames of the output
+    :return np.ndarray:
+        samples of shape (frames, channels)
+    """
+    return stretch_batch([samples], [frames])[0]
+
+
+def stretch_batch(clips: list, lengths: list) -> list:
+    """
+    stretch many clips keeping their tone
+    :param list clips:
+        samples of shape (frames, channels) of each clip
+    :param list lengths:
+        number of frames of the output of each clip
+    :return list:
+        stretched samples of shape (frames, channels) of each clip
+    """
+    # every channel of every clip is stretched as one signal, identical channels (a mono speech) only once
+    mono = [clip.shape[1] > 1 and all(np.array_equal(clip[:, 0], clip[:, c]) for c in range(1, clip.shape[1]))
+            for clip in clips]
+    signals = [(clip[:, c], length) for clip, length, m in zip(clips, lengths, mono)
+               for c in range(1 if m else clip.shape[1])]
+
+    outputs = []
+    batch, size = [], 0
+    for signal, length in signals:
+        frames = signal_frames(len(signal))
+        if batch and size + frames > BATCH_FRAMES:
+            outputs += vocode(batch)
+            batch, size = [], 0
+        batch.append((signal, length))
+        size += frames
+    if batch:
+        outputs += vocode(batch)
+
+    results = []
+    for clip, m in zip(clips, mono):
+        count = 1 if m else clip.shape[1]
+        channels, outputs = outputs[:count], outputs[count:]
+        results.append(np.repeat(channels[0][:, None], clip.shape[1], axis=1) if m else np.stack(channels, axis=1))
+    return results
+
+
+def signal_frames(length: int) -> int:
+    """number of analysis frames of a signal once padded"""
+    return 1 + (length + N_FFT // 2) // HOP
+
+
+def vocode(signals: list) -> list:
+    """
+    stretch a batch of 1d signals with a phase vocoder
+    the frames of every signal are concatenated, so the fft, the phase accumulation and the overlap add
+    are each made once for the whole batch
+    :param list signals:
+        list of (samples, length) with samples the 1d signal and length the number of samples of the output
+    :return list:
+        stretched 1d signals
+    """
+    analysis, positions, first, counts = [], [], [], []
+    offset = 0
+    for samples, length in signals:
+        padded = np.pad(samples.astype(np.float32), (N_FFT // 2, N_FFT))
+        frames = np.lib.stride_tricks.sliding_window_view(padded, N_FFT)[::HOP]
+        n = len(frames)
+        # one output frame every HOP samples, read at the matching time of the input
+        m = -(-length // HOP) + 1
+        speed = len(samples) / length if length else 1.
+        t = np.minimum(np.arange(m) * speed, n - 2 + 1e-9)
+
+        analysis.append(frames)
+        positions.append(offset + t)
+        first.append(offset)
+        counts.append(m)
+        offset += n
+
+    spectrum = np.fft.rfft(np.concatenate(analysis) * WINDOW, axis=1).astype(np.complex64)
+    magnitude = np.abs(spectrum)
+    phase = np.angle(spectrum)
+    del spectrum
+
+    position = np.concatenate(positions)
+    index = position.astype(np.int64)
+    fraction = (position - index)[:, None]
+
+    # magnitude interpolated between the two nearest frames, phase advanced by their instantaneous frequency
+    output = magnitude[index]
+    output += fraction * (magnitude[index + 1] - output)
+    delta = phase[index + 1] - phase[index] - OMEGA
+    # the advance is only needed modulo 2 pi, it is wrapped into [-pi, pi] and the expected advance is added back
+    delta -= TWO_PI * np.round(delta / TWO_PI)
+    advance = delta + OMEGA
+
+    # accumulate the phase of each signal from its first frame, the cumulative sum restarts at every signal
+    counts = np.array(counts)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    accumulated = np.cumsum(advance, axis=0, dtype=np.float64) - advance
+    accumulated -= np.repeat(accumulated[starts], counts, axis=0)
+    accumulated += np.repeat(phase[first], counts, axis=0)
+    accumulated = np.remainder(accumulated, TWO_PI).astype(np.float32)
+
+    spectrum = np.empty(output.shape, dtype=np.complex64)
+    spectrum.real = output * np.cos(accumulated)
+    spectrum.imag = output * np.sin(accumulated)
+    frames = np.fft.irfft(spectrum, n=N_FFT, axis=1).astype(np.float32) * WINDOW
+
+    # overlap add, the signals are separated by empty frames so they do not overlap each other
+    overlap = N_FFT // HOP
+    rows = np.repeat(starts + overlap * np.arange(len(counts)), counts) + np.arange(len(position)) - \
+        np.repeat(starts, counts)
+    slots = np.zeros((len(position) + overlap * len(counts), N_FFT), dtype=np.float32)
+    slots[rows] = frames
+    blocks = np.zeros((len(slots) + overlap, HOP), dtype=np.float32)
+    for r in range(overlap):
+        blocks[r:r + len(slots)] += slots[:, r * HOP:(r + 1) * HOP]
+    track = blocks.ravel() / 1.5
+
+    results = []
+    for (samples, length), start, row in zip(signals, starts, rows[starts]):
+        begin = row * HOP + N_FFT // 2
+        results.append(track[begin:begin + length])
+    return results
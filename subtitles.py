@@ -2,186 +2,619 @@
 """
 Subtitles file include Subtitles class who process everything related to subtitles
 """
-import wave
-import contextlib
-import pandas as pd
+import os
+import numpy as np
+import audio
+from cues import Cues
+import config
+from cache import AudioCache
+from store import PackStore
+from instrument import Instrument
 from files import subtitle_directory
 import unicodedata
 import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import synthesis
+import planner
+from render import RenderState, speech_key
 
 
 class Subtitles:
     """Subtitles class which allows tools with subtitles and text to speech from subtitles"""
 
-    def __init__(self, file, language: str='en'):
+    def __init__(self, file, language: str='en', voice=None, cache: AudioCache=None, cues=None,
+                 instrument: Instrument=None, packed: bool=False):
         """
         Construct a :class:`Subtitles <Subtitles>`.
         :param File file:
             File object of the subtitles
         :param str language:
             language of the output
+        :param voice:
+            id of the pyttsx3 voice or None for the default one
+        :param AudioCache cache:
+            cache of the recorded speeches or None to always record them
+        :param cues:
+            sequences (start, end, text) already parsed and NFC normalized, the file is not read if given
+        :param Instrument instrument:
+            records the time of the speech stages and the number of sequences synthesized
+        :param bool packed:
+            keep the speeches in the packed store of the directory instead of one file per sequence
         """
         self.file = file
         self.directory = subtitle_directory(self.file.path, find=False, create=True)
         self.language = language
-        self.df = pd.DataFrame(columns=["n", "time", "text"]).set_index("n")
+        self.voice = voice
+        self.cache = cache
+        self.instrument = instrument or Instrument()
+        self.cues = Cues()
+        self.source = None
+        self.index = audio.AudioIndex(str(self.directory))
+        self.store = PackStore(str(self.directory)) if packed else None
 
         self._engine = None
+        self.failed = {}
 
         self.generated = False
-        self.boot()
+        self.boot(cues)
 
     @property
     def engine(self):
         if not self._engine:
             import pyttsx3
             self._engine = pyttsx3.init()
+            if self.voice:
+                self._engine.setProperty('voice', self.voice)
         return self._engine
 
-    def boot(self):
-        """boot the Subtitle object"""
+    @property
+    def df(self):
+        """pandas export of the sequences table"""
+        return self.cues.to_pandas()
+
+    def boot(self, cues=None):
+        """
+        boot the Subtitle object
+        :param cues:
+            sequences (start, end, text) already parsed, None reads the file
+        """
         self.set_language()
-        self.read()
+        if cues is None:
+            self.read()
+        else:
+            self.load(cues)
 
     def read(self):
-        """read the subtitle file and convert it into a dataframe"""
-        if self.file:
-            with open(str(self.file), 'r', encoding='utf-8-sig') as f:
-                subtitles_string = f.read()
-
-            if self.file.extension == '.vtt':
-                for n, sequence in enumerate(subtitles_string.split('\n\n')[1:]):
-                    temp = sequence.split('\n')
-                    time = [t.replace(',', '.') for t in temp[0].split(' --> ')]
-                    text = ' '.join(temp[1:])
-                    self.append({"time": time, "text": text})
-
-            elif self.file.extension == '.srt':
-                for sequence in subtitles_string.split('\n\n'):
-                    temp = sequence.split('\n')
-                    time = [t.replace(',', '.') for t in temp[1].split(' --> ')]
-                    text = ' '.join(temp[2:])
-                    self.append({"time": time, "text": text})
-            else:
-                raise Exception(f'unknown subtitle format : "{self.file.extension}"')
-        else:
+        """read the subtitle file and convert it into a table of sequences"""
+        if not self.file:
             raise FileNotFoundError(f'cannot find {self.file}')
+        if self.file.extension not in ('.vtt', '.srt'):
+            raise Exception(f'unknown subtitle format : "{self.file.extension}"')
 
-        self.update_df()
+        starts, ends, texts = [], [], []
+        with open(str(self.file), 'r', encoding='utf-8-sig') as f:
+            for start, end, text in self.parse(f):
+                starts.append(start)
+                ends.append(end)
+                texts.append(text)
 
-    def append(self, subtitle):
-        """append the dataframe of subtitles"""
-        if subtitle["time"] != '' and subtitle["text"] != '':
-            self.df = self.df.append(subtitle, ignore_index=True)
+        # one bulk construction instead of one copy of the table per sequence
+        self.cues = Cues(starts, ends, texts)
 
-    def update_df(self):
-        """update the dataframe by creating new columns based on the default ones"""
+        self.update_cues()
+
+    def load(self, cues):
+        """
+        build the table of sequences from sequences already parsed, such as the captions of a Download
+        :param cues:
+            sequences (start, end, text) with their text already NFC normalized
+        """
+        cues = [(start, end, text) for start, end, text in cues if text]
+        self.cues = Cues([c[0] for c in cues], [c[1] for c in cues], [c[2] for c in cues])
+        self.update_cues(normalize=False)
+
+    @staticmethod
+    def parse(lines):
+        """
+        parse srt or vtt lines one by one and yield the sequences
+        blocks without a timing line (WEBVTT header, NOTE, STYLE, REGION) are skipped
+        :param lines:
+            iterable of lines, such as an opened file
+        :return:
+            generator of (start, end, text) with start and end in seconds
+        """
+        block = []
+        for line in lines:
+            line = line.rstrip('\r\n')
+            if line.strip():
+                block.append(line)
+                continue
+            if block:
+                sequence = Subtitles.parse_block(block)
+                if sequence:
+                    yield sequence
+                block = []
+        if block:
+            sequence = Subtitles.parse_block(block)
+            if sequence:
+                yield sequence
+
+    @staticmethod
+    def parse_block(block: list):
+        """
+        parse a block of lines of a srt or vtt file
+        :param list block:
+            non empty lines of the block
+        :return:
+            (start, end, text) or None if the block is not a sequence
+        """
+        for i, line in enumerate(block):
+            if '-->' in line:
+                start, _, end = line.partition('-->')
+                # cue settings such as "align:start position:0%" follow the end timestamp
+                end = end.split()
+                if not end:
+                    return None
+                text = ' '.join(block[i + 1:]).strip()
+                if not text:
+                    return None
+                return Subtitles.time_from_string(start.strip()), Subtitles.time_from_string(end[0]), text
+        return None
+
+    def update_cues(self, normalize: bool=True):
+        """
+        update the columns of the table based on the default ones
+        :param bool normalize:
+            NFC normalize the texts, unless they already are
+        """
 
         # normalize the text to avoid problems on speech
-        self.df["text"] = self.df["text"].apply(lambda t: unicodedata.normalize('NFC', t))
+        if normalize:
+            self.cues.text = [unicodedata.normalize('NFC', t) for t in self.cues.text]
 
         # count words
-        self.df["words"] = self.df["text"].apply(self.count_words)
+        self.cues.words = np.fromiter((self.count_words(t) for t in self.cues.text), dtype=np.int32,
+                                      count=len(self.cues))
 
         # duration
-        self.df["duration"] = self.df["time"].apply(self.get_duration_timestamp)
+        self.cues.duration = self.cues.end - self.cues.start
+
+    def plan(self, max_gap: float=planner.MAX_GAP, max_duration: float=planner.MAX_DURATION,
+             max_chars: int=planner.MAX_CHARS):
+        """
+        replace the sequences by the utterances to speak, before the speech
+        the short sequences of a sentence are merged and the long sequences are split at their punctuation,
+        self.source keeps the sequences of the file, so the utterances can be planned again
+        :param float max_gap:
+            longest silence in seconds between two merged sequences
+        :param float max_duration:
+            longest utterance in seconds
+        :param int max_chars:
+            longest utterance in characters
+        """
+        if self.source is None:
+            self.source = self.cues
+        self.cues = planner.plan(self.source, max_gap=max_gap, max_duration=max_duration, max_chars=max_chars)
+        self.update_cues(normalize=False)
+        print(f'Planned {len(self.cues)} utterances from {len(self.source)} sequences')
 
     def set_language(self):
         """update the language using the file subtitle extension"""
         temp = self.file.name.split('.')
         self.language = temp[-1] if len(temp) > 1 else self.language
 
-    def speech(self, mode='pyttsx3', depth: int=2):
-        """convert dataframe into mp3 speeches files"""
-        if mode == 'pyttsx3':
-            self.speech_pyttsx3(depth)
-        elif mode == 'gtts':
-            self.speech_gtts()
-        else:
+    def speech(self, mode='pyttsx3', depth: int=2, workers: int=1, tolerance: float=0.05, predict: bool=False,
+               socket: str=config.TTS_SOCKET, incremental: bool=False, concurrency: int=8, url: str=config.GTTS_URL,
+               request_rate: float=0, retries: int=3):
+        """
+        convert the sequences into mp3 speeches files
+        :param str mode:
+            "pyttsx3", "daemon" (pyttsx3 engines of the speech daemon), "gtts" or "gtts_async"
+        :param int workers:
+            number of worker processes of pyttsx3
+        :param str socket:
+            unix socket of the speech daemon
+        :param bool incremental:
+            keep the speeches of the previous render whose text did not change, only record the others
+        :param int concurrency:
+            maximum number of requests in flight of gtts_async
+        :param str url:
+            endpoint of the requests of gtts_async, can be a local server
+        :param float request_rate:
+            maximum number of requests per second per host of gtts_async, 0 for no limit
+        :param int retries:
+            number of retries of a failed request of gtts_async
+        """
+        if mode not in ('pyttsx3', 'daemon', 'gtts', 'gtts_async'):
             raise Exception(f'unknown mode : {mode}')
+        engine = 'gtts' if mode.startswith('gtts') else 'pyttsx3'
+        # the keys are the ones of the texts before the preprocessing of gtts
+        keys = self.speech_keys(engine)
+        with self.instrument.stage('speech'):
+            reused = self.reuse(keys) if incremental else None
+            if mode == 'pyttsx3':
+                self.speech_pyttsx3(depth, workers=workers, tolerance=tolerance, predict=predict, reused=reused)
+            elif mode == 'daemon':
+                from daemon import Client
+                self.speech_pyttsx3(depth, tolerance=tolerance, predict=predict, client=Client(socket),
+                                    reused=reused)
+            elif mode == 'gtts':
+                self.speech_gtts(reused=reused)
+            else:
+                self.speech_gtts_async(concurrency=concurrency, rate=request_rate, retries=retries, url=url,
+                                       reused=reused)
+        self.save_speeches(keys, engine)
+
+    def speech_keys(self, engine: str) -> list:
+        """
+        get the key of the speech of each sequence
+        :param str engine:
+            "pyttsx3" or "gtts"
+        """
+        voice = self.voice if engine == 'pyttsx3' else None
+        return [speech_key(engine, voice, self.language, text) for text in self.cues.text]
 
-    def speech_pyttsx3(self, depth: int=2):
+    def reuse(self, keys: list):
+        """
+        keep the speeches of the previous render of the directory whose key is still the key of a sequence
+        their files are renamed after the number of their new sequence, their rate and their duration are restored
+        :param list keys:
+            key of the speech of each sequence
+        :return:
+            boolean mask of the sequences whose speech is kept
+        """
+        state = RenderState(str(self.directory))
+        previous = {}
+        for m, speech in enumerate(state.speeches):
+            recorded = m in self.store if self.store is not None else os.path.exists(self.get_file(m))
+            if speech.get('key') and recorded:
+                previous.setdefault(speech['key'], []).append((m, speech))
+
+        reused = np.zeros(len(self), dtype=bool)
+        moves = []
+        for n, key in enumerate(keys):
+            if previous.get(key):
+                m, speech = previous[key].pop(0)
+                reused[n] = True
+                self.cues.rate[n] = np.nan if speech.get('rate') is None else speech['rate']
+                moves.append((m, n))
+
+        moves = [(m, n) for m, n in moves if m != n]
+        if self.store is not None:
+            self.store.renumber(moves)
+            self.store.save()
+        else:
+            # renamed in two steps so no file is replaced before it is moved
+            for m, n in moves:
+                os.replace(self.get_file(m), f'{self.get_file(m)}.reuse')
+            for m, n in moves:
+                os.replace(f'{self.get_file(m)}.reuse', self.get_file(n))
+
+        self.failed = {}
+        self.grade_pyttsx3(reused)
+        print(f'Reusing {int(reused.sum())} speeches of the previous render, '
+              f'{len(self) - int(reused.sum())} sequences to record')
+        return reused
+
+    def save_speeches(self, keys: list, engine: str):
         """
-        convert dataframe into mp3 speeches files using pyttsx3 module
+        record the key and the rate of the speech of each sequence for the next incremental render
+        :param list keys:
+            key of the speech of each sequence
+        :param str engine:
+            "pyttsx3" or "gtts"
+        """
+        state = RenderState(str(self.directory))
+        state.speeches = [{'key': None if n in self.failed else key,
+                           'rate': None if engine != 'pyttsx3' or np.isnan(rate) else rate}
+                          for n, (key, rate) in enumerate(zip(keys, self.cues.rate.tolist()))]
+        state.save()
+        if self.store is not None:
+            self.store.compact()
+
+    def speech_pyttsx3(self, depth: int=2, workers: int=1, tolerance: float=0.05, predict: bool=False, client=None,
+                       reused=None):
+        """
+        convert the sequences into mp3 speeches files using pyttsx3 module
         conversion is made locally
         :param int depth:
             number of recursions
+        :param int workers:
+            number of worker processes, each one with its own engine, 1 renders in this process
+        :param float tolerance:
+            sequences whose ratio recorded/duration is within 1 +/- tolerance are not rendered again
+        :param bool predict:
+            seed the rate of each sequence from its words per second instead of the default rate
+        :param daemon.Client client:
+            client of the speech daemon which renders the sequences, None renders them in this process or the pool
+        :param reused:
+            boolean mask of the sequences whose speech is kept from the previous render,
+            they are recorded again only if they do not fit their sequence anymore
         """
-        self.init_pyttsx3()
-
-        for sequence in self:
-            # change property about engine locally here
-            self.engine.setProperty('rate', sequence.rate)
-            self.engine.save_to_file(text=sequence.text, filename=self.get_file(sequence[0]), name=str(sequence.index))
+        rate = self.cues.rate
+        if predict:
+            self.predict_rate()
+
+        pending = np.ones(len(self), dtype=bool)
+        if reused is not None:
+            self.cues.rate = np.where(reused, rate, self.cues.rate).astype(np.float32)
+            pending = ~(reused & (np.abs(self.cues.ratio - 1) <= tolerance))
+
+        pool = None
+        if workers > 1 and not client:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=synthesis.init_pyttsx3, initargs=(self.voice,))
+
+        try:
+            for n in range(depth + 1):
+                if not pending.any():
+                    break
+                with self.instrument.stage(f'pass-{n}'):
+                    self.init_pyttsx3(pending)
+                    with self.instrument.stage('render'):
+                        self.render_pyttsx3(pending, pool=pool, workers=workers, client=client)
+                    with self.instrument.stage('grade'):
+                        self.grade_pyttsx3(pending)
+
+                # unknown ratios (failed sequences) are pending too
+                pending = ~(np.abs(self.cues.ratio - 1) <= tolerance)
+        finally:
+            if pool:
+                pool.shutdown()
 
-        self.engine.runAndWait()
+        self.generated = True
 
-        self.grade_pyttsx3()
+    def render_pyttsx3(self, pending=None, pool: ProcessPoolExecutor=None, workers: int=1, client=None):
+        """
+        render the pending sequences once with their current rate
+        :param pending:
+            boolean mask of the sequences to render, None renders every sequence
+        :param ProcessPoolExecutor pool:
+            pool of workers initialized with synthesis.init_pyttsx3, None renders in this process
+        :param int workers:
+            number of workers of the pool
+        :param daemon.Client client:
+            client of the speech daemon, which renders the sequences instead of this process or the pool
+        """
+        self.failed = {}
+        sequences = [sequence for sequence in self if pending is None or pending[sequence.Index]]
+        numbers = [sequence.Index for sequence in sequences]
+        sequences = self.from_cache('pyttsx3', sequences)
+
+        if client:
+            jobs = [(s.Index, s.text, s.rate, self.get_file(s.Index)) for s in sequences]
+            self.failed = client.speech(jobs, voice=self.voice) if jobs else {}
+        elif not pool:
+            for sequence in sequences:
+                self.remove_file(sequence.Index)
+                # change property about engine locally here
+                self.engine.setProperty('rate', sequence.rate)
+                self.engine.save_to_file(text=sequence.text, filename=self.get_file(sequence[0]),
+                                         name=str(sequence.Index))
+            if sequences:
+                self.engine.runAndWait()
+        else:
+            jobs = [(sequence.Index, sequence.text, sequence.rate, self.get_file(sequence.Index))
+                    for sequence in sequences]
+            for shard in as_completed(synthesis.submit(pool, jobs, workers)):
+                self.failed.update(shard.result())
 
-        if depth > 0:
-            self.speech_pyttsx3(depth=depth-1)
+        for n in sorted(self.failed):
+            print(f'Warning sequence {n} failed : {self.failed[n]}')
 
-        self.generated = True
+        self.to_cache('pyttsx3', sequences)
+        self.pack(numbers)
 
-    def grade_pyttsx3(self):
-        """update the dataframe using recored files informations"""
-        self.df["recorded"] = self.df.apply(self.get_record, axis=1)
-        self.df["ratio"] = self.df["recorded"] / self.df["duration"]
+    def grade_pyttsx3(self, pending=None):
+        """
+        update the table using recored files informations
+        :param pending:
+            boolean mask of the sequences rendered since the last grading, None grades every sequence
+        """
+        numbers = np.arange(len(self)) if pending is None else np.flatnonzero(pending)
+        self.cues.recorded[numbers] = np.fromiter(
+            (np.nan if n in self.failed else self.get_record(n) for n in numbers.tolist()),
+            dtype=np.float32, count=len(numbers))
+        self.cues.ratio = self.cues.recorded / self.cues.duration
+        self.index.save()
+
+    def init_pyttsx3(self, pending=None):
+        """
+        update the rate of every sequence using recored files informations
+        :param pending:
+            boolean mask of the sequences to update, None updates every sequence
+        """
+        rate = np.where(np.isnan(self.cues.rate), 150, self.cues.rate)
+        rate = np.where(np.isnan(self.cues.ratio), rate, rate * self.cues.ratio)
+        if pending is not None:
+            rate = np.where(pending, rate, self.cues.rate)
+        self.cues.rate = rate.astype(np.float32)
 
-    def init_pyttsx3(self):
-        """update the dataframe using recored files informations"""
-        if 'ratio' in self.df:
-            self.df["rate"] = self.df["rate"] * self.df["ratio"]
-        else:
-            self.df["rate"] = 150
+    def predict_rate(self, minimum: float=80, maximum: float=400):
+        """
+        seed the rate (words per minute) of each sequence from its number of words and its duration
+        :param float minimum:
+            lowest rate predicted
+        :param float maximum:
+            highest rate predicted
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = 60 * self.cues.words / self.cues.duration
+        self.cues.rate = np.clip(np.nan_to_num(rate, nan=150, posinf=maximum), minimum, maximum).astype(np.float32)
 
-    def speech_gtts(self, preprocess: bool=True):
+    def speech_gtts(self, preprocess: bool=True, reused=None):
         """
-        convert dataframe into mp3 speeches files using gTTs module
+        convert the sequences into mp3 speeches files using gTTs module
         conversion is made using requests to google translate
         :param bool preprocess:
             preprocess the text before rendering it to speech
+        :param reused:
+            boolean mask of the sequences whose speech is kept from the previous render, None records every sequence
         """
         from gtts import gTTS
         from gtts.tokenizer import pre_processors
 
         if preprocess:
-            self.df["text"] = self.df["text"].apply(pre_processors.word_sub)
+            self.cues.text = [pre_processors.word_sub(t) for t in self.cues.text]
+
+        self.failed = {}
 
-        for sequence in self:
+        sequences = [sequence for sequence in self if reused is None or not reused[sequence.Index]]
+        for sequence in self.from_cache('gtts', sequences):
+            self.remove_file(sequence.Index)
             speech = gTTS(text=sequence.text, lang=self.language, slow=False)
             speech.save(self.get_file(sequence[0]))
+            self.to_cache('gtts', [sequence])
+        self.pack([sequence.Index for sequence in sequences])
 
         self.generated = True
 
-    def get_record(self, series) -> float:
+    def speech_gtts_async(self, preprocess: bool=True, concurrency: int=8, rate: float=0, retries: int=3,
+                          url: str=config.GTTS_URL, reused=None):
         """
-        get the length of the corresponding recorded speech file from a series object of the dataframe
-        :param series:
+        convert the sequences into mp3 speeches files using concurrent requests to google translate
+        :param bool preprocess:
+            preprocess the text before rendering it to speech
+        :param int concurrency:
+            maximum number of requests in flight
+        :param float rate:
+            maximum number of requests per second per host, 0 for no limit
+        :param int retries:
+            number of retries of a failed request
+        :param str url:
+            endpoint of the requests, can be a local server
+        :param reused:
+            boolean mask of the sequences whose speech is kept from the previous render, None records every sequence
+        """
+        import asyncio
+        import gtts_async
+
+        if preprocess:
+            from gtts.tokenizer import pre_processors
+            self.cues.text = [pre_processors.word_sub(t) for t in self.cues.text]
+
+        self.failed = {}
+        sequences = [sequence for sequence in self if reused is None or not reused[sequence.Index]]
+        numbers = [sequence.Index for sequence in sequences]
+        sequences = self.from_cache('gtts', sequences)
+        for sequence in sequences:
+            self.remove_file(sequence.Index)
+
+        jobs = [(sequence.Index, sequence.text, self.get_file(sequence.Index)) for sequence in sequences]
+        self.failed = asyncio.run(gtts_async.speech(jobs, lang=self.language, concurrency=concurrency, rate=rate,
+                                                    retries=retries, url=url))
+
+        for n in sorted(self.failed):
+            print(f'Warning sequence {n} failed : {self.failed[n]}')
+
+        self.to_cache('gtts', sequences)
+        self.pack(numbers)
+        self.generated = True
+
+    def cache_key(self, engine: str, sequence) -> str:
+        """
+        get the key of a sequence in the cache
+        :param str engine:
+            "pyttsx3" or "gtts"
+        :param sequence:
+            sequence of the table
+        """
+        rate = sequence.rate if engine == 'pyttsx3' else None
+        return self.cache.key(engine, self.voice, self.language, rate, sequence.text)
+
+    def from_cache(self, engine: str, sequences: list) -> list:
+        """
+        serve the sequences found in the cache
+        :param str engine:
+            "pyttsx3" or "gtts"
+        :param list sequences:
+            sequences to record
+        :return list:
+            sequences missing from the cache which still need to be recorded
+        """
+        if self.cache is None:
+            return sequences
+        missing = [sequence for sequence in sequences
+                   if not self.cache.get(self.cache_key(engine, sequence), self.get_file(sequence.Index))]
+        self.instrument.count('sequences_cached', len(sequences) - len(missing))
+        return missing
+
+    def to_cache(self, engine: str, sequences: list):
+        """
+        add the recorded sequences to the cache and count them
+        :param str engine:
+            "pyttsx3" or "gtts"
+        :param list sequences:
+            sequences just recorded
+        """
+        self.instrument.count('sequences_synthesized', sum(s.Index not in self.failed for s in sequences))
+        if self.cache is None:
+            return
+        for sequence in sequences:
+            file = self.get_file(sequence.Index)
+            if sequence.Index not in self.failed and os.path.exists(file):
+                self.cache.put(self.cache_key(engine, sequence), file)
+
+    def pack(self, numbers: list):
+        """
+        move the speeches just recorded or served by the cache into the packed store, their files are removed
+        the previous speech of a failed sequence is dropped from the store
+        :param list numbers:
+            numbers of the sequences recorded
+        """
+        if self.store is None:
+            return
+        for n in numbers:
+            file = self.get_file(n)
+            if n in self.failed:
+                self.store.discard(n)
+            elif os.path.exists(file):
+                self.store.put(n, file)
+        self.store.save()
+
+    def remove_file(self, n: int):
+        """
+        remove the recorded speech file of a sequence so it is written in a new file, never through a cache link
+        :param n:
+        """
+        file = self.get_file(n)
+        if os.path.exists(file):
+            os.remove(file)
+
+    def get_record(self, n: int) -> float:
+        """
+        get the length of the corresponding recorded speech file from the number of the sequence
+        :param n:
+        """
+        if self.store is not None:
+            return self.store.duration(n)
+        return self.index.duration(self.get_file(n=n))
+
+    def get_source(self, n: int):
+        """
+        get the speech of a sequence as given to the Mixer, its samples in the packed store or its file
+        :param n:
         """
-        return self.get_duration_file(self.get_file(n=series.name))
+        if self.store is not None:
+            return self.store.read(n)
+        return self.get_file(n)
 
     def get_file(self, n: int) -> str:
         """
-        get the name of the corresponding recorded speech file from the number of the row in the dataframe
+        get the name of the corresponding recorded speech file from the number of the sequence
         :param n:
         """
-        return f'{self.directory}\\seq-{n}.mp3'
+        return os.path.join(str(self.directory), f'seq-{n}.mp3')
 
     @staticmethod
     def get_duration_file(file) -> float:
         """
-        get the duration of an audio file
+        get the duration of an audio file (wav, aiff or mp3) from its headers
         :param file:
             file full name
         :return float:
             duration
         """
-        with contextlib.closing(wave.open(file, 'r')) as f:
-            frames = f.getnframes()
-            rate = f.getframerate()
-            duration = frames / float(rate)
-            return duration
+        return audio.info(file)['duration']
 
     @staticmethod
     def get_duration_timestamp(timestamp):
@@ -195,14 +628,16 @@ class Subtitles:
     @staticmethod
     def time_from_string(element: str):
         """
-        convert a str time '00:00:00.000' into a float in seconds
+        convert a str time '00:00:00.000', '00:00:00,000' or '00:00.000' into a float in seconds
         :param str element:
             string of the time
         :return float:
             time in seconds
         """
-        h, m, s = [float(e) for e in element.split(':')]
-        return 60 * 60 * h + 60 * m + s
+        seconds = 0.
+        for e in element.replace(',', '.').split(':'):
+            seconds = 60 * seconds + float(e)
+        return seconds
 
     @staticmethod
     def count_words(text: str) -> int:
@@ -216,16 +651,16 @@ class Subtitles:
         return len(re.findall(r'\S+', text))  # \S+ -> one or more non-whitespace characters
 
     def __iter__(self):
-        """allows to iter self as it iter the rows of the dataframe"""
-        return self.df.itertuples()
+        """allows to iter self as it iter the sequences of the table"""
+        return iter(self.cues)
 
     def __getitem__(self, i):
         """get the sequence number i"""
-        return self.df.iloc[i]
+        return self.cues[i]
 
     def __len__(self):
         """get the number of sequences"""
-        return self.df.shape[0]
+        return len(self.cues)
 
     def __bool__(self):
         """returns if the subtitles voices has been recorded"""
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Synthesis file include the functions run by the worker processes of a parallel text to speech
+each worker process holds its own pyttsx3 engine, initialized once and switched from a voice to another
+"""
+import os
+
+_engine = None
+_voice = None
+# voice the engine speaks with, and the one of the system
+_current = None
+_default = None
+
+
+def init_pyttsx3(voice=None):
+    """
+    initialize the pyttsx3 engine of the worker process
+    :param voice:
+        id of the voice of the engine or None for the default one, the voice used when a shard does not give one
+    """
+    global _voice
+    _voice = voice
+    engine(voice)
+
+
+def engine(voice=None):
+    """
+    get the engine of the process speaking with a voice, pyttsx3 has one engine per driver
+    :param voice:
+        id of the voice or None for the default one
+    """
+    global _engine, _current, _default
+    if _engine is None:
+        import pyttsx3
+        _engine = pyttsx3.init()
+        _default = _current = _engine.getProperty('voice')
+    voice = voice or _default
+    if voice != _current:
+        _engine.setProperty('voice', voice)
+        _current = voice
+    return _engine
+
+
+def submit(pool, jobs: list, workers: int, voice=None) -> list:
+    """
+    render sequences in shards over a pool of workers initialized with init_pyttsx3
+    :param concurrent.futures.ProcessPoolExecutor pool:
+        pool of the workers
+    :param list jobs:
+        list of (n, text, rate, file) of the sequences to render
+    :param int workers:
+        number of workers of the pool
+    :param voice:
+        id of the voice, None for the voice of init_pyttsx3
+    :return list:
+        future of each shard, whose result is the error message of each failed sequence by number
+    """
+    # several shards per worker so a slow shard does not hold the others
+    size = max(1, -(-len(jobs) // (workers * 4)))
+    return [pool.submit(speech_pyttsx3, jobs[i:i + size], voice) for i in range(0, len(jobs), size)]
+
+
+def speech_pyttsx3(jobs, voice=None) -> dict:
+    """
+    render a shard of sequences with the engine of the worker process
+    :param list jobs:
+        list of (n, text, rate, file) of the sequences to render
+    :param voice:
+        id of the voice, None for the voice of init_pyttsx3
+    :return dict:
+        error message of each failed sequence by number
+    """
+    speaker = engine(voice or _voice)
+    errors = {}
+    queued = []
+    for n, text, rate, file in jobs:
+        try:
+            # remove the previous record so a silent failure of the engine can be detected
+            if os.path.exists(file):
+                os.remove(file)
+            speaker.setProperty('rate', rate)
+            speaker.save_to_file(text=text, filename=file, name=str(n))
+            queued.append((n, file))
+        except Exception as e:
+            errors[n] = f'{type(e).__name__}: {e}'
+
+    try:
+        speaker.runAndWait()
+    except Exception as e:
+        for n, _ in queued:
+            errors[n] = f'{type(e).__name__}: {e}'
+        return errors
+
+    for n, file in queued:
+        if not os.path.exists(file) or not os.path.getsize(file):
+            errors[n] = 'no audio file written'
+    return errors
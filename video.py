@@ -1,4 +1,24 @@
 """video"""
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from mixer import ffmpeg_exe
+
+# video codecs each container can store as they are
+CONTAINER_CODECS = {
+    '.mp4': ('h264', 'hevc', 'mpeg4', 'av1', 'vp9'),
+    '.m4v': ('h264', 'hevc', 'mpeg4'),
+    '.mov': ('h264', 'hevc', 'mpeg4', 'prores', 'mjpeg'),
+    '.mkv': None,
+    '.webm': ('vp8', 'vp9', 'av1'),
+    '.avi': ('h264', 'mpeg4', 'msmpeg4v2', 'msmpeg4v3', 'mjpeg', 'mpeg2video'),
+}
+# audio codec used to store the new track in each container
+CONTAINER_AUDIO = {'.webm': 'libopus', '.avi': 'libmp3lame'}
+# video encoder of each container when the video is encoded again, libx264 for the others
+CONTAINER_VIDEO = {'.webm': 'libvpx-vp9', '.avi': 'mpeg4'}
 
 
 class Video:
@@ -8,3 +28,134 @@ class Video:
         if not file:
             raise FileNotFoundError(f'File {file} not found')
         self.file = file
+        self._probe = None
+
+    def probe(self) -> dict:
+        """
+        read the duration and the codec of the video stream from ffmpeg
+        :return dict:
+            duration in seconds and video codec
+        """
+        if not self._probe:
+            output = subprocess.run([ffmpeg_exe(), '-hide_banner', '-i', str(self.file)],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE).stderr.decode('utf-8', 'replace')
+            duration = re.search(r'Duration: (\d+):(\d+):(\d+\.?\d*)', output)
+            codec = re.search(r'Stream #\S+.*?: Video: (\w+)', output)
+            if not duration:
+                raise ValueError(f'cannot read the duration of {self.file}')
+            h, m, s = duration.groups()
+            self._probe = {'duration': 3600 * int(h) + 60 * int(m) + float(s),
+                           'codec': codec.group(1) if codec else None}
+        return self._probe
+
+    @property
+    def duration(self) -> float:
+        """duration of the video in seconds"""
+        return self.probe()['duration']
+
+    def can_remux(self, extension: str) -> bool:
+        """
+        the video stream can be copied as it is in a container
+        :param str extension:
+            extension of the output with the dot
+        """
+        if extension.lower() not in CONTAINER_CODECS:
+            return False
+        codecs = CONTAINER_CODECS[extension.lower()]
+        return codecs is None or self.probe()['codec'] in codecs
+
+    def remux(self, audio_file: str, output: str, extension: str):
+        """
+        copy the video stream bit for bit with a new audio track, only the audio is encoded
+        :param str audio_file:
+            file of the new audio track
+        :param str output:
+            file of the output
+        :param str extension:
+            extension of the output with the dot
+        """
+        command = [ffmpeg_exe(), '-y', '-v', 'error', '-i', str(self.file), '-i', audio_file,
+                   '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy',
+                   '-c:a', CONTAINER_AUDIO.get(extension.lower(), 'aac'), output]
+        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+    def keyframes(self) -> list:
+        """
+        read the times of the keyframes of the video stream, only the keyframes are decoded
+        :return list:
+            times in seconds
+        """
+        output = subprocess.run([ffmpeg_exe(), '-hide_banner', '-skip_frame', 'nokey', '-i', str(self.file),
+                                 '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'],
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE).stderr.decode('utf-8', 'replace')
+        return sorted(float(t) for t in re.findall(r'pts_time:\s*(-?\d+\.?\d*)', output))
+
+    def segments(self, count: int) -> list:
+        """
+        split the video into segments starting at keyframes, as close as possible to segments of the same duration
+        :param int count:
+            number of segments wanted, there are less of them if the video has less keyframes
+        :return list:
+            (start, end) of each segment in seconds, end is None for the last one
+        """
+        duration = self.duration
+        keyframes = [t for t in self.keyframes() if 0 < t < duration]
+        bounds = [0.]
+        for i in range(1, count):
+            target = duration * i / count
+            later = [t for t in keyframes if t > bounds[-1]]
+            if not later:
+                break
+            nearest = min(later, key=lambda t: abs(t - target))
+            if nearest not in bounds:
+                bounds.append(nearest)
+        return list(zip(bounds, bounds[1:] + [None]))
+
+    def render_segments(self, audio_file: str, output: str, extension: str, workers: int=0):
+        """
+        encode the video again in segments starting at keyframes, each one by its own ffmpeg process,
+        then join the segments without encoding them again and add the new audio track, encoded once
+        :param str audio_file:
+            file of the new audio track
+        :param str output:
+            file of the output
+        :param str extension:
+            extension of the output with the dot
+        :param int workers:
+            number of segments encoded at once, 0 for the number of cores
+        """
+        workers = workers or os.cpu_count()
+        segments = self.segments(workers)
+        # the cores are shared by the encoders running at once
+        threads = max(1, os.cpu_count() // len(segments))
+        encoder = CONTAINER_VIDEO.get(extension.lower(), 'libx264')
+        directory = f'{output}.segments'
+        os.makedirs(directory, exist_ok=True)
+
+        def encode(i, start, end):
+            part = os.path.join(directory, f'part-{i:04}{extension}')
+            command = [ffmpeg_exe(), '-y', '-v', 'error', '-ss', f'{start:.6f}', '-i', str(self.file)]
+            if end is not None:
+                command += ['-t', f'{end - start:.6f}']
+            command += ['-map', '0:v:0', '-an', '-c:v', encoder, '-threads', str(threads), part]
+            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+            return part
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(lambda segment: encode(*segment),
+                                          [(i, start, end) for i, (start, end) in enumerate(segments)]))
+
+            playlist = os.path.join(directory, 'parts.txt')
+            with open(playlist, 'w', encoding='utf-8') as f:
+                for part in parts:
+                    # quotes are escaped as in a shell
+                    path = os.path.abspath(part).replace("'", "'\\''")
+                    f.write(f"file '{path}'\n")
+
+            command = [ffmpeg_exe(), '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', playlist,
+                       '-i', audio_file, '-map', '0:v:0', '-map', '1:a:0', '-c:v', 'copy',
+                       '-c:a', CONTAINER_AUDIO.get(extension.lower(), 'aac'), output]
+            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)